@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+
+# =================================================================
+# BENCHMARK: TIME TO FIRST PROMPT
+# =================================================================
+# Launches `python -m app.main` the way a user would and measures how long
+# it takes until the input prompt is printed. Exits non-zero when the best
+# of the runs is over budget, so it can guard against heavy imports
+# creeping back into startup.
+#
+#   python -m app.bench_startup --budget 1.0 --runs 3
+#
+# Add --importtime to list the slowest imports of the last run.
+
+PROMPT = "Your Query Here >"
+DEFAULT_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0"))
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def time_to_prompt(timeout=60.0, importtime=False):
+    """
+    Seconds from process start until PROMPT appears on stdout.
+
+    Returns:
+    - tuple: (seconds or None on timeout/crash, captured stderr)
+    """
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-m", "app.main"]
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, cwd=project_root, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    stderr = []
+    threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True).start()
+
+    seen, elapsed = b"", None
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        byte = proc.stdout.read(1)
+        if not byte:
+            break
+        seen += byte
+        if seen.endswith(PROMPT.encode("utf-8")):
+            elapsed = time.perf_counter() - start
+            break
+
+    try:
+        proc.communicate(input=b"exit\n", timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+    return elapsed, b"".join(stderr).decode("utf-8", "replace")
+
+def slowest_imports(importtime_log, top=15):
+    """
+    Parses `-X importtime` output into (cumulative seconds, module) pairs.
+    """
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative) / 1e6, module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if app.main takes too long to reach its prompt.")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Seconds allowed (best run).")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports.")
+    args = parser.parse_args()
+
+    times = []
+    for _ in range(args.runs):
+        elapsed, _ = time_to_prompt()
+        if elapsed is None:
+            print("❌ app.main never reached the prompt.")
+            sys.exit(1)
+        times.append(elapsed)
+
+    best = min(times)
+    print(f"⏱️  Time to prompt: best {best:.3f} s, runs: {', '.join(f'{t:.3f}' for t in times)}")
+
+    if args.importtime:
+        _, log = time_to_prompt(importtime=True)
+        print("\nSlowest imports (cumulative):")
+        for seconds, module in slowest_imports(log):
+            print(f"  {seconds:7.3f} s  {module}")
+
+    if best > args.budget:
+        print(f"❌ Over the {args.budget:.2f} s startup budget.")
+        sys.exit(1)
+    print(f"✅ Within the {args.budget:.2f} s startup budget.")
+
+if __name__ == "__main__":
+    main()
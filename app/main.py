@@ -8,7 +8,6 @@ from dotenv import load_dotenv
 # 1. CONFIGURATION & ENVIRONMENT SETUP
 # =================================================================
 load_dotenv()
-from openai import OpenAI
 
 # =================================================================
 # 2. DYNAMIC PATH ALIGNMENT
@@ -23,19 +22,49 @@ if project_root not in sys.path:
 # =================================================================
 # 3. COMPONENT INITIALIZATION
 # =================================================================
+# Only light modules are imported here. The Chroma store opens on the
+# first query, API clients are created on first use, and the audio stack
+# (sounddevice, scipy, pydub) loads only when voice mode is entered.
 try:
-    from rag.vector_store import collection, query_db 
-    from voice.speaker import speak_text, stop_audio, is_audio_playing
-    from voice.listener import record_and_transcribe
+    from rag.vector_store import query_db, query_cache, semantic_cache
+    from rag.openai_client import get_client
     print("✅ System: Neural Interface Online.")
 except ImportError as e:
     print(f"❌ IMPORT ERROR: {e}")
     sys.exit(1)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# =================================================================
+# 4. VOICE STACK (loaded on demand)
+# =================================================================
+
+def record_and_transcribe():
+    try:
+        from voice.listener import record_and_transcribe as record
+    except ImportError as e:
+        print(f"❌ Voice mode unavailable: {e}")
+        return ""
+    return record()
+
+def speak_text(text):
+    try:
+        from voice.speaker import speak_text as speak
+    except ImportError as e:
+        print(f"❌ Voice output unavailable: {e}")
+        return
+    speak(text)
+
+def is_audio_playing():
+    # Nothing can be playing before voice mode has loaded the speaker.
+    speaker = sys.modules.get("voice.speaker")
+    return bool(speaker and speaker.is_audio_playing())
+
+def stop_audio():
+    speaker = sys.modules.get("voice.speaker")
+    if speaker:
+        speaker.stop_audio()
 
 # =================================================================
-# 4. UTILITY FUNCTIONS
+# 5. UTILITY FUNCTIONS
 # =================================================================
 
 def save_lead_to_backend(data):
@@ -63,10 +92,17 @@ def check_intent(user_input):
     return any(word in clean for word in positive)
 
 # =================================================================
-# 5. CORE INTERACTION ENGINE
+# 6. CORE INTERACTION ENGINE
 # =================================================================
 
-def start_bot():
+def start_bot(warmup=False):
+    # Opt-in warm-up (rag/warmup.py) runs while the banner prints and the
+    # user types; the first query waits for it instead of paying for it.
+    warmup_thread = None
+    if warmup:
+        from rag.warmup import start_warmup
+        warmup_thread = start_warmup()
+
     print("\n" + "═"*60)
     print("  CHATOPIA!  ")
     print("  Your Thought, my response.  ")
@@ -88,7 +124,19 @@ def start_bot():
         is_voice_mode = False 
 
         if raw_input.lower() in ["exit", "quit", "terminate"]: 
+            for label, cache in (("Query cache", query_cache), ("Semantic cache", semantic_cache)):
+                stats = cache.stats()
+                if stats["hits"] + stats["misses"]:
+                    print(f"📊 {label}: {stats['hit_ratio']:.0%} hit ratio "
+                          f"({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['saved_ms']:.0f} ms saved")
             print("Session terminated. Have a productive day."); break
+
+        if warmup_thread:
+            from rag.warmup import JOIN_TIMEOUT
+            warmup_thread.join(timeout=JOIN_TIMEOUT)
+            if warmup_thread.is_alive():
+                print("⏳ Warm-up is taking too long; answering without it.")
+            warmup_thread = None
             
         if not raw_input:
             # ONLY triggers if user just hit Enter (No Text)
@@ -151,7 +199,7 @@ def start_bot():
             chunks = query_db(user_input, n_results=3)
             context = "\n".join(chunks)
             
-            response = client.chat.completions.create(
+            response = get_client("chat").chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": (
@@ -178,4 +226,4 @@ def start_bot():
             print(f"❌ System Fault: {e}")
 
 if __name__ == "__main__":
-    start_bot()
\ No newline at end of file
+    start_bot(warmup="--warmup" in sys.argv or os.getenv("CHATOPIA_WARMUP") == "1")
\ No newline at end of file
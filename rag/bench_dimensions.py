@@ -0,0 +1,116 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import chromadb
+
+from rag.config import FULL_EMBEDDING_DIMENSIONS
+
+# =================================================================
+# BENCHMARK: REDUCED EMBEDDING DIMENSIONS
+# =================================================================
+# Compares shortened text-embedding-3 vectors against full-size exact
+# search: HNSW index size on disk, query latency and recall@k.
+#
+#   python -m rag.bench_dimensions --dims 256 512 1024 --k 5
+#
+# No API calls are made. text-embedding-3 vectors can be shortened by
+# keeping the first d values and re-normalizing, which is what the API's
+# `dimensions` parameter returns, so stored full-size vectors are enough.
+
+def load_vectors(vectors_path=None, collection_name="betopia_knowledge"):
+    """
+    Full-dimension vectors from a .npy file, or from the existing Chroma store.
+    """
+    if vectors_path:
+        return np.load(vectors_path).astype(np.float32)
+
+    from rag.vector_store import DB_PATH
+    client = chromadb.PersistentClient(path=DB_PATH)
+    data = client.get_collection(collection_name, embedding_function=None).get(include=["embeddings"])
+    return np.asarray(data["embeddings"], dtype=np.float32)
+
+def shorten(vectors, dimensions):
+    """
+    Truncates to the first `dimensions` values and re-normalizes each row.
+    """
+    short = vectors[:, :dimensions]
+    return short / np.linalg.norm(short, axis=1, keepdims=True)
+
+def exact_top_k(corpus, queries, query_ids, k):
+    """
+    Ground truth: brute-force cosine top-k, excluding each query itself.
+    """
+    scores = queries @ corpus.T
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path) for name in files
+    )
+
+def bench_dimension(vectors, query_ids, truth, dimensions, k):
+    """
+    Builds a throwaway on-disk HNSW collection at the given size and
+    measures it. Returns (index_bytes, mean_ms, p95_ms, recall).
+    """
+    short = shorten(vectors, dimensions)
+    workdir = tempfile.mkdtemp(prefix=f"bench_{dimensions}d_")
+    try:
+        client = chromadb.PersistentClient(path=workdir)
+        collection = client.create_collection(
+            name="bench", embedding_function=None, metadata={"hnsw:space": "cosine"}
+        )
+        ids = [str(i) for i in range(len(short))]
+        batch = client.get_max_batch_size()
+        for start in range(0, len(short), batch):
+            collection.add(ids=ids[start:start + batch], embeddings=short[start:start + batch])
+
+        # --- QUERY LATENCY & RECALL ---
+        latencies, hits = [], 0
+        for row, query_id in enumerate(query_ids):
+            t0 = time.perf_counter()
+            result = collection.query(query_embeddings=short[query_id:query_id + 1], n_results=k + 1, include=[])
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+            found = [int(i) for i in result["ids"][0] if int(i) != query_id][:k]
+            hits += len(set(found) & set(truth[row].tolist()))
+
+        # Release file handles before measuring and deleting the directory.
+        del collection, client
+        return _dir_size(workdir), float(np.mean(latencies)), float(np.percentile(latencies, 95)), hits / (len(query_ids) * k)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark for reduced embedding dimensions.")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="Number of stored vectors reused as queries.")
+    parser.add_argument("--vectors", help="Optional .npy file of full-dimension vectors instead of the Chroma store.")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vectors)
+    if len(vectors) <= args.k:
+        print(f"❌ Need more than {args.k} vectors to benchmark, found {len(vectors)}.")
+        return
+    vectors = shorten(vectors, vectors.shape[1])
+
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    truth = exact_top_k(vectors, vectors[query_ids], query_ids, args.k)
+
+    print(f"📊 {len(vectors)} vectors, {len(query_ids)} queries, recall@{args.k} vs. exact {vectors.shape[1]}-d search\n")
+    print(f"{'dims':>6} {'index MB':>10} {'mean ms':>9} {'p95 ms':>8} {'recall':>8}")
+    for dimensions in sorted(set(args.dims + [FULL_EMBEDDING_DIMENSIONS])):
+        if dimensions > vectors.shape[1]:
+            continue
+        size, mean_ms, p95_ms, recall = bench_dimension(vectors, query_ids, truth, dimensions, args.k)
+        print(f"{dimensions:>6} {size / 1e6:>10.2f} {mean_ms:>9.2f} {p95_ms:>8.2f} {recall:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,248 @@
 import re
+from collections import deque
 
 # =================================================================
 # TEXT PROCESSING UTILITIES: CHUNKER
 # =================================================================
 
+# Words and the whitespace between them. The capture group keeps the
+# whitespace so the final joined text looks natural.
+_WHITESPACE = re.compile(r'(\s+)')
+
+def _iter_tokens(pages, page_separator="\n"):
+    """
+    Streams the same tokens that re.split(r'(\\s+)', full_text) would return,
+    without ever building the full text or the full token list.
+
+    Parameters:
+    - pages (iterable of str): Page strings, e.g. from a PDF loader.
+    - page_separator (str): Appended after every page, mirroring the "\\n"
+                            that extract_text_from_pdf adds between pages.
+    """
+    # The last token of a piece may continue into the next piece
+    # (a word cut in half, or a whitespace run spanning two pages),
+    # so it is held back and re-split together with the next piece.
+    pending = ""
+    for page in pages:
+        for piece in (page, page_separator):
+            if not piece:
+                continue
+            tokens = _WHITESPACE.split(pending + piece)
+            if len(tokens) == 1:
+                pending = tokens[0]
+            elif tokens[-1] == "":
+                # Piece ended in whitespace: hold back the word before it
+                # too, so re-splitting never invents an empty leading word.
+                yield from tokens[:-3]
+                pending = tokens[-3] + tokens[-2]
+            else:
+                yield from tokens[:-1]
+                pending = tokens[-1]
+
+    # --- FLUSH ---
+    # Whatever is left is split exactly as the tail of the full text would be.
+    yield from _WHITESPACE.split(pending)
+
+def iter_chunks(pages, chunk_size=800, chunk_overlap=150, page_separator="\n"):
+    """
+    Streaming version of chunk_text: yields chunks as soon as they are full.
+
+    Runs in linear time and memory bounded by one chunk: only the tokens of
+    the chunk being assembled are kept, in a deque with a running length.
+
+    Parameters:
+    - pages (iterable of str): Page strings, consumed lazily.
+    - chunk_size (int): Max characters per chunk.
+    - chunk_overlap (int): How many characters to repeat from the previous chunk.
+    - page_separator (str): Text appended after each page. Use "" together
+                            with a single-item list to reproduce chunk_text.
+    """
+    current_chunk = deque()
+    current_length = 0
+    overlap_ratio = chunk_overlap / chunk_size
+
+    for token in _iter_tokens(pages, page_separator):
+        current_chunk.append(token)
+        current_length += len(token)
+
+        if current_length >= chunk_size:
+            yield "".join(current_chunk)
+
+            # --- OVERLAP ---
+            # Same rule as chunk_text, but the tail is kept by popping from
+            # the left and subtracting, instead of re-summing the window.
+            keep = max(1, int(len(current_chunk) * overlap_ratio))
+            while len(current_chunk) > keep:
+                current_length -= len(current_chunk.popleft())
+
+    if current_chunk:
+        yield "".join(current_chunk)
+
+def _iter_token_units(pages, page_separator="\n"):
+    """
+    Groups the whitespace tokens into units of leading whitespace + word.
+
+    Spaces attach to the following word in the OpenAI BPE pre-tokenizer,
+    so most units tokenize exactly as they do in the joined text. Not all:
+    cl100k merges trailing punctuation with the newlines after it ("end."
+    + "\n\nNext"), which these units split apart. The sum of per-unit
+    token counts is therefore an upper bound on the count of the joined
+    text, not an exact count; chunks may come out slightly under budget.
+    """
+    tokens = _iter_tokens(pages, page_separator)
+    # The first token is always a word (possibly empty).
+    unit = next(tokens)
+    for whitespace in tokens:
+        yield unit
+        unit = whitespace + next(tokens)
+    yield unit
+
+def iter_token_chunks(pages, chunk_tokens=200, chunk_overlap_tokens=40, page_separator="\n"):
+    """
+    Token-budgeted variant of iter_chunks: sizes chunks in model tokens.
+
+    Each chunk stays within chunk_tokens (unless a single word is larger),
+    which keeps embedding batches and prompt budgets predictable. Every
+    unit is measured once through the memoized count_tokens and the window
+    keeps a running token total, so nothing is re-tokenized while sliding.
+
+    Parameters:
+    - pages (iterable of str): Page strings, consumed lazily.
+    - chunk_tokens (int): Max model tokens per chunk.
+    - chunk_overlap_tokens (int): Max tokens repeated from the previous chunk.
+    - page_separator (str): Text appended after each page.
+    """
+    # Imported here so the character-based chunker works without tiktoken.
+    from rag.tokenizer import count_tokens
+
+    current_chunk = deque()
+    current_tokens = 0
+
+    for unit in _iter_token_units(pages, page_separator):
+        unit_tokens = count_tokens(unit)
+
+        if current_chunk and current_tokens + unit_tokens > chunk_tokens:
+            yield "".join(text for text, _ in current_chunk)
+
+            # --- OVERLAP ---
+            # Keep the longest tail that fits in the overlap budget,
+            # always dropping at least one unit so the window moves forward.
+            _, dropped = current_chunk.popleft()
+            current_tokens -= dropped
+            while current_chunk and current_tokens > chunk_overlap_tokens:
+                _, dropped = current_chunk.popleft()
+                current_tokens -= dropped
+
+        current_chunk.append((unit, unit_tokens))
+        current_tokens += unit_tokens
+
+    if current_chunk:
+        yield "".join(text for text, _ in current_chunk)
+
+def chunk_text_by_tokens(text, chunk_tokens=200, chunk_overlap_tokens=40):
+    """
+    List-returning convenience wrapper around iter_token_chunks.
+
+    Parameters:
+    - text (str): The raw string extracted from the document.
+    - chunk_tokens (int): Max model tokens per chunk.
+    - chunk_overlap_tokens (int): Max tokens repeated from the previous chunk.
+    """
+    return list(iter_token_chunks([text], chunk_tokens, chunk_overlap_tokens, page_separator=""))
+
+def _split_block(block, chunk_size):
+    """
+    Cuts an oversized block at whitespace into pieces of at most chunk_size
+    characters (a single longer word stays whole), keeping exact offsets.
+    """
+    text = block["text"]
+    piece_start = 0
+    piece_end = 0
+    for match in re.finditer(r'\S+', text):
+        if match.end() - piece_start > chunk_size and piece_end > piece_start:
+            yield dict(block, text=text[piece_start:piece_end],
+                       char_start=block["char_start"] + piece_start,
+                       char_end=block["char_start"] + piece_end)
+            piece_start = match.start()
+        piece_end = match.end()
+    yield dict(block, text=text[piece_start:piece_end],
+               char_start=block["char_start"] + piece_start,
+               char_end=block["char_start"] + piece_end)
+
+def iter_layout_chunks(blocks, chunk_size=800):
+    """
+    Layout-aware chunker: packs whole paragraphs into chunks and starts a
+    new chunk at every heading and every page break.
+
+    Chunks therefore never straddle sections or pages, and each one knows
+    where it came from, which is what citations and neighbour lookups need.
+
+    Parameters:
+    - blocks (iterable of dict): Output of rag.pdf_loader.iter_pdf_blocks.
+    - chunk_size (int): Max characters per chunk (whole blocks are kept
+                        together whenever they fit).
+
+    Yields:
+    - dict: {"text": str, "metadata": {"page", "char_start", "char_end", "heading"}}
+      with character offsets into the page text of that page.
+    """
+    current = []
+    current_length = 0
+    heading = ""
+
+    def flush():
+        return {
+            "text": "\n".join(b["text"] for b in current),
+            "metadata": {
+                "page": current[0]["page"],
+                "char_start": current[0]["char_start"],
+                "char_end": current[-1]["char_end"],
+                # Chroma metadata values cannot be None.
+                "heading": heading,
+            },
+        }
+
+    for block in blocks:
+        # --- 1. HARD BOUNDARIES ---
+        # A heading opens a new section (consecutive headings stay together);
+        # a new page always starts a new chunk.
+        headings_only = all(b["is_heading"] for b in current)
+        if current and (current[0]["page"] != block["page"] or (block["is_heading"] and not headings_only)):
+            yield flush()
+            current, current_length = [], 0
+
+        if block["is_heading"]:
+            title = " ".join(block["text"].split())
+            heading = f"{heading} / {title}" if current else title
+
+        # --- 2. PARAGRAPH PACKING ---
+        pieces = [block] if len(block["text"]) <= chunk_size else _split_block(block, chunk_size)
+        for piece in pieces:
+            # Headings are never emitted on their own; they lead into their first paragraph.
+            headings_only = all(b["is_heading"] for b in current)
+            if current and not headings_only and current_length + 1 + len(piece["text"]) > chunk_size:
+                yield flush()
+                current, current_length = [], 0
+            current.append(piece)
+            current_length += len(piece["text"]) + (1 if current_length else 0)
+
+    if current:
+        yield flush()
+
 def chunk_text(text, chunk_size=800, chunk_overlap=150):
     """
     Expert Fix: Splits by whitespace/sentences to preserve meaning.
-    
+
     This function breaks down large PDF text into smaller, manageable pieces
     that fit within the LLM's context window.
-    
+
     Parameters:
     - text (str): The raw string extracted from the document.
     - chunk_size (int): Max characters per chunk. 800 is a 'sweet spot' for RAG.
     - chunk_overlap (int): How many characters to repeat from the previous chunk.
                            This ensures context isn't lost at the cutting point.
-    """
 
-    # --- 1. TOKENIZATION ---
-    # re.split(r'(\s+)', text) splits the text into words and spaces.
-    # We keep the spaces so the final joined text looks natural.
-    tokens = re.split(r'(\s+)', text)
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    # --- 2. CHUNK ASSEMBLY ---
-    for token in tokens:
-        current_chunk.append(token)
-        current_length += len(token)
-        
-        # Check if the current collection of tokens has reached the size limit
-        if current_length >= chunk_size:
-            # Join tokens back into a single string and add to our list
-            chunks.append("".join(current_chunk))
-            
-            # --- 3. OVERLAP CALCULATION ---
-            # To prevent losing context, we don't start the next chunk from scratch.
-            # We calculate how many tokens represent our 'chunk_overlap' size.
-            overlap_count = int(len(current_chunk) * (chunk_overlap / chunk_size))
-            
-            # Slide the window back: keep the tail end of the current chunk
-            # to become the start of the next chunk.
-            current_chunk = current_chunk[-max(1, overlap_count):]
-            current_length = sum(len(t) for t in current_chunk)
-            
-    # --- 4. FINAL CLEANUP ---
-    # If there is any remaining text that didn't reach 'chunk_size', 
-    # add it as the final chunk.
-    if current_chunk:
-        chunks.append("".join(current_chunk))
-        
-    return chunks
\ No newline at end of file
+    Output is byte-identical to earlier releases; it is now a thin wrapper
+    around iter_chunks, which should be preferred for large documents.
+    """
+    return list(iter_chunks([text], chunk_size, chunk_overlap, page_separator=""))
@@ -0,0 +1,35 @@
+import os
+from dotenv import load_dotenv
+
+# =================================================================
+# SHARED EMBEDDING SETTINGS
+# =================================================================
+# Ingestion, querying and index creation must agree on these values,
+# so they are defined once here instead of in each module.
+
+load_dotenv()
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# text-embedding-3 models can return shortened vectors (e.g. 512 instead
+# of 1536) that keep most of the retrieval quality. Measure the trade-off
+# with `python -m rag.bench_dimensions` before changing it.
+FULL_EMBEDDING_DIMENSIONS = 1536
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", FULL_EMBEDDING_DIMENSIONS))
+
+# Vectors of different sizes cannot share an index, so reduced-dimension
+# setups get their own collection next to the original one.
+COLLECTION_NAME = (
+    "betopia_knowledge" if EMBEDDING_DIMENSIONS == FULL_EMBEDDING_DIMENSIONS
+    else f"betopia_knowledge_{EMBEDDING_DIMENSIONS}d"
+)
+
+# Chunks whose estimated similarity (MinHash, 0-1) to an already indexed
+# chunk reaches this value are stored as references to it instead of
+# being embedded again (see rag/dedup.py). Set to 0 to disable.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+# Most rows written to ChromaDB in one add() call. Chroma rejects batches
+# above its client's limit (5461 with the default SQLite settings); lower
+# this if your build reports a smaller one.
+CHROMA_MAX_ADD_BATCH = int(os.getenv("CHROMA_MAX_ADD_BATCH", "5000"))
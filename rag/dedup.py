@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import numpy as np
+from contextlib import closing
+
+from rag.config import NEAR_DUPLICATE_THRESHOLD
+
+# =================================================================
+# NEAR-DUPLICATE CHUNK DETECTION (MinHash + LSH)
+# =================================================================
+# Boilerplate (company blurbs, contact blocks, legal lines) recurs across
+# documents with small edits. Each chunk gets a MinHash signature over its
+# word 3-grams; LSH buckets narrow the search to a few candidates, and the
+# share of equal signature slots estimates their Jaccard similarity.
+#
+# A chunk close enough to one already indexed is not embedded. It is kept
+# here as a reference to that "canonical" row instead.
+#
+# Everything is keyed by the collection's id rather than its name: a
+# wiped or recreated collection gets a new id, so it never inherits
+# signatures and references that point at rows it does not have.
+#
+#   python -m rag.dedup          (prints how much has been saved so far)
+
+DEDUP_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "dedup_index.sqlite3")
+
+NUM_PERM = 128
+# Indexed chunks whose signatures are compared per new chunk; the ones
+# sharing the most LSH buckets with it are taken first.
+MAX_CANDIDATES = 500
+BANDS = 32  # 4 slots per band: pairs above ~0.45 similarity become candidates
+SHINGLE_WORDS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    collection  TEXT NOT NULL,
+    chunk_id    TEXT NOT NULL,
+    signature   BLOB NOT NULL,
+    PRIMARY KEY (collection, chunk_id)
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    collection  TEXT NOT NULL,
+    bucket      TEXT NOT NULL,
+    chunk_id    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (collection, bucket);
+CREATE INDEX IF NOT EXISTS buckets_chunk ON buckets (collection, chunk_id);
+CREATE TABLE IF NOT EXISTS refs (
+    collection   TEXT NOT NULL,
+    chunk_id     TEXT NOT NULL,
+    source       TEXT NOT NULL,
+    canonical_id TEXT NOT NULL,
+    similarity   REAL NOT NULL,
+    bytes        INTEGER NOT NULL,
+    metadata     TEXT NOT NULL,
+    created_at   REAL NOT NULL,
+    PRIMARY KEY (collection, chunk_id)
+);
+CREATE INDEX IF NOT EXISTS refs_source ON refs (collection, source);
+CREATE INDEX IF NOT EXISTS refs_canonical ON refs (collection, canonical_id);
+"""
+
+def _connect():
+    os.makedirs(os.path.dirname(DEDUP_PATH), exist_ok=True)
+    conn = sqlite3.connect(DEDUP_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+# --- SIGNATURES ---
+
+def minhash(text):
+    """
+    NUM_PERM-slot MinHash signature (uint32) of the text's word 3-grams.
+    """
+    words = text.lower().split()
+    shingles = {
+        " ".join(words[i:i + SHINGLE_WORDS])
+        for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+    }
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # One row per permutation; (a*x + b) stays below 2**63, so no overflow.
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _PRIME
+    return (permuted & 0xFFFFFFFF).min(axis=1).astype(np.uint32)
+
+def _buckets(signature):
+    rows = NUM_PERM // BANDS
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return float(np.mean(sig_a == sig_b))
+
+# --- LOOKUP ---
+
+def find_duplicates(collection_id, items, threshold=NEAR_DUPLICATE_THRESHOLD, exclude=()):
+    """
+    Matches chunks against indexed chunks and against each other.
+
+    Parameters:
+    - collection_id (str): The collection's id; signatures are kept per collection.
+    - items (list of (chunk_id, text)): Chunks about to be embedded.
+    - threshold (float): Minimum estimated similarity; 0 disables matching.
+    - exclude (iterable of str): Chunk ids that may not be used as a match
+                                 (e.g. rows the current sync deletes).
+
+    Returns:
+    - dict: {chunk_id: (canonical_id, similarity)} for every near-duplicate.
+      A chunk matching an earlier chunk of `items` points at that chunk,
+      which therefore must be written in the same sync.
+    """
+    if not threshold or not items:
+        return {}
+    exclude = set(exclude)
+    signatures = {chunk_id: minhash(text) for chunk_id, text in items}
+    matches = {}
+    pending = {}  # bucket -> ids of not-yet-indexed chunks from this call
+
+    try:
+        with closing(_connect()) as conn:
+            for chunk_id, _ in items:
+                signature = signatures[chunk_id]
+                buckets = _buckets(signature)
+
+                # Ranked by shared buckets (ties by id), so which candidates
+                # survive the cap never depends on set order.
+                hits = conn.execute(
+                    f"SELECT chunk_id, COUNT(*) FROM buckets WHERE collection = ? "
+                    f"AND bucket IN ({','.join('?' * len(buckets))}) GROUP BY chunk_id",
+                    [collection_id, *buckets]
+                ).fetchall()
+                candidates = sorted(
+                    (pair for pair in hits if pair[0] not in exclude), key=lambda pair: (-pair[1], pair[0])
+                )
+                stored = {}
+                if candidates:
+                    part = [cid for cid, _ in candidates[:MAX_CANDIDATES]]
+                    stored = {
+                        cid: np.frombuffer(blob, dtype=np.uint32)
+                        for cid, blob in conn.execute(
+                            f"SELECT chunk_id, signature FROM signatures WHERE collection = ? "
+                            f"AND chunk_id IN ({','.join('?' * len(part))})",
+                            [collection_id, *part]
+                        )
+                    }
+                for bucket in buckets:
+                    for cid in pending.get(bucket, ()):
+                        stored[cid] = signatures[cid]
+
+                best = min(
+                    ((cid, similarity(signature, sig)) for cid, sig in stored.items()),
+                    key=lambda pair: (-pair[1], pair[0]), default=(None, 0.0)
+                )
+                if best[0] is not None and best[1] >= threshold:
+                    matches[chunk_id] = best
+                else:
+                    for bucket in buckets:
+                        pending.setdefault(bucket, []).append(chunk_id)
+    except sqlite3.Error as e:
+        print(f"⚠️ Near-duplicate index unavailable: {e}")
+        return {}
+    return matches
+
+# --- BOOKKEEPING ---
+
+def add_signatures(collection_id, items):
+    """
+    Indexes chunks that were written as real vectors, so later chunks can
+    match them. items: list of (chunk_id, text).
+    """
+    rows, bucket_rows = [], []
+    for chunk_id, text in items:
+        signature = minhash(text)
+        rows.append((collection_id, chunk_id, signature.tobytes()))
+        bucket_rows.extend((collection_id, b, chunk_id) for b in _buckets(signature))
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.executemany(
+                "DELETE FROM buckets WHERE collection = ? AND chunk_id = ?",
+                [(collection_id, chunk_id) for _, chunk_id, _ in rows]
+            )
+            conn.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)", rows)
+            conn.executemany("INSERT INTO buckets VALUES (?, ?, ?)", bucket_rows)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update near-duplicate index: {e}")
+
+def get_references(collection_id, source):
+    """
+    Returns {chunk_id: (canonical_id, similarity)} for a source's stored
+    references.
+    """
+    try:
+        with closing(_connect()) as conn:
+            return {
+                chunk_id: (canonical_id, similarity)
+                for chunk_id, canonical_id, similarity in conn.execute(
+                    "SELECT chunk_id, canonical_id, similarity FROM refs WHERE collection = ? AND source = ?",
+                    (collection_id, source)
+                )
+            }
+    except sqlite3.Error as e:
+        print(f"⚠️ Near-duplicate index unavailable: {e}")
+        return {}
+
+def set_references(collection_id, source, references):
+    """
+    Replaces all references of a source.
+
+    Parameters:
+    - references (list of dict): {"chunk_id", "canonical_id", "similarity",
+                                  "text", "metadata"} per near-duplicate chunk.
+    """
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM refs WHERE collection = ? AND source = ?", (collection_id, source))
+            conn.executemany(
+                "INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (collection_id, r["chunk_id"], source, r["canonical_id"], r["similarity"],
+                     len(r["text"].encode("utf-8")), json.dumps(r["metadata"]), now)
+                    for r in references
+                ]
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update near-duplicate index: {e}")
+
+def forget_chunks(collection_id, chunk_ids):
+    """
+    Drops deleted rows from the index, together with every reference that
+    pointed at them.
+
+    Returns:
+    - set of str: Sources that lost references. Their chunks are no longer
+      covered by any vector and must be re-synced.
+    """
+    chunk_ids = list(chunk_ids)
+    orphaned = set()
+    try:
+        with closing(_connect()) as conn, conn:
+            for i in range(0, len(chunk_ids), 500):
+                part = chunk_ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                orphaned.update(source for (source,) in conn.execute(
+                    f"SELECT DISTINCT source FROM refs WHERE collection = ? AND canonical_id IN ({marks})",
+                    [collection_id, *part]
+                ))
+                for table, column in (("refs", "canonical_id"), ("refs", "chunk_id"),
+                                      ("signatures", "chunk_id"), ("buckets", "chunk_id")):
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE collection = ? AND {column} IN ({marks})",
+                        [collection_id, *part]
+                    )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update near-duplicate index: {e}")
+    return orphaned
+
+def dedup_stats(collection_id=None):
+    """
+    Totals over all stored references, or those of one collection id.
+
+    Returns:
+    - dict: {"references", "bytes_saved", "embeddings_saved", "indexed"}.
+    """
+    where, params = ("WHERE collection = ?", (collection_id,)) if collection_id else ("", ())
+    try:
+        with closing(_connect()) as conn:
+            refs, saved = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM refs {where}", params).fetchone()
+            (indexed,) = conn.execute(f"SELECT COUNT(*) FROM signatures {where}", params).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Near-duplicate index unavailable: {e}")
+        return {"references": 0, "bytes_saved": 0, "embeddings_saved": 0, "indexed": 0}
+    # Every reference is one embedding and one stored vector that was never created.
+    return {"references": refs, "bytes_saved": saved, "embeddings_saved": refs, "indexed": indexed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate savings in the knowledge base.")
+    parser.add_argument("--collection", help="Limit the report to one collection.")
+    args = parser.parse_args()
+
+    collection_id = None
+    if args.collection:
+        from rag.vector_store import get_chroma_client
+        collection_id = str(get_chroma_client().get_collection(args.collection).id)
+
+    stats = dedup_stats(collection_id)
+    print(f"♻️  {stats['references']} near-duplicate chunks stored as references "
+          f"({stats['indexed']} chunks indexed)")
+    print(f"   {stats['embeddings_saved']} embeddings and vectors saved, "
+          f"{stats['bytes_saved'] / 1024:.1f} KB of text not embedded")
+
+if __name__ == "__main__":
+    main()
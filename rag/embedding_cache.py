@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from contextlib import closing
+
+# =================================================================
+# PERSISTENT EMBEDDING CACHE
+# =================================================================
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "embedding_cache.sqlite3")
+
+# Size cap (number of vectors). Least recently used rows are evicted
+# once the cap is exceeded; a 1536-dim float16 vector is ~3 KB on disk.
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# float16 halves the footprint again and is plenty for cosine search;
+# set EMBEDDING_CACHE_DTYPE=float32 to store vectors losslessly.
+STORE_DTYPE = np.dtype(os.getenv("EMBEDDING_CACHE_DTYPE", "float16"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model       TEXT NOT NULL,
+    dimensions  INTEGER NOT NULL,
+    text_hash   TEXT NOT NULL,
+    dtype       TEXT NOT NULL,
+    vector      BLOB NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (model, dimensions, text_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def _connect():
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def get_cached_embeddings(texts, model, dimensions=0):
+    """
+    Looks up many texts at once.
+
+    Parameters:
+    - texts (list of str): Texts exactly as they are sent to the API.
+    - model (str): Embedding model name.
+    - dimensions (int): Requested output dimensions (0 = model default).
+
+    Returns:
+    - dict: {index in texts: float32 vector} for every cache hit.
+    """
+    hashes = [_text_hash(t) for t in texts]
+    found = {}
+    try:
+        with closing(_connect()) as conn, conn:
+            # Chunked to stay under SQLite's bound-parameter limit.
+            for i in range(0, len(hashes), 500):
+                part = list(set(hashes[i:i + 500]))
+                rows = conn.execute(
+                    f"SELECT text_hash, dtype, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [model, dimensions, *part]
+                ).fetchall()
+                for text_hash, dtype, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+
+            # --- LRU BOOKKEEPING ---
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model, dimensions, h) for h in found]
+                )
+    except sqlite3.Error as e:
+        print(f"⚠️ Embedding cache unavailable: {e}")
+
+    hits = {i: found[h] for i, h in enumerate(hashes) if h in found}
+    with _stats_lock:
+        _stats["hits"] += len(hits)
+        _stats["misses"] += len(texts) - len(hits)
+    return hits
+
+def store_embeddings(texts, vectors, model, dimensions=0):
+    """
+    Saves freshly computed vectors and evicts the least recently used rows
+    when the cache grows past MAX_ENTRIES.
+    """
+    now = time.time()
+    rows = [
+        (model, dimensions, _text_hash(t), STORE_DTYPE.name,
+         np.asarray(v, dtype=STORE_DTYPE).tobytes(), now)
+        for t, v in zip(texts, vectors)
+    ]
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(model, dimensions, text_hash, dtype, vector, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # --- EVICTION ---
+            # Trim to 90% of the cap so eviction runs rarely, not on every insert.
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > MAX_ENTRIES:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - int(MAX_ENTRIES * 0.9),)
+                )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not write embedding cache: {e}")
+
+def cache_stats():
+    """
+    Hit/miss counters for this process.
+
+    Returns:
+    - dict: {"hits", "misses", "hit_rate"}.
+    """
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
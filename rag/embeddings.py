@@ -1,11 +1,21 @@
 import os
+import json
 import base64
 import time
+import queue
+import hashlib
+import threading
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
 from tenacity import retry, stop_after_attempt, wait_random_exponential
+from rag.openai_client import get_client
+from rag.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, CHROMA_MAX_ADD_BATCH
+from rag.tokenizer import count_tokens_batch
+from rag.embedding_cache import get_cached_embeddings, store_embeddings
+from rag import manifest, dedup
+from rag.image_pipeline import iter_pdf_images, prepare_image, image_content, TRIAGE_REASONS
+from rag.vision_cache import get_cached_descriptions, store_descriptions
 
 # =================================================================
 # 1. INITIALIZATION & API SECURITY
@@ -17,114 +27,596 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise ValueError("❌ OPENAI_API_KEY not found in .env")
 
-client = OpenAI(api_key=api_key)
+# Shared connection pool (rag.openai_client); vision calls get a longer timeout.
+client = get_client("embeddings")
+vision_client = get_client("vision")
 
 # =================================================================
 # 2. VISION OPTIMIZATION (GPT-4o-mini Vision)
 # =================================================================
 
+VISION_MODEL = "gpt-4o-mini"
+VISION_PROMPT = "Describe this image technically. Focus on text, labels, and data points for RAG retrieval."
+# Cached descriptions are only reused for the prompt that produced them.
+_VISION_PROMPT_HASH = hashlib.sha256(VISION_PROMPT.encode("utf-8")).hexdigest()[:16]
+
 # The @retry decorator handles temporary internet blips or API rate limits.
 # Exponential backoff means it waits longer between each subsequent retry.
 @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
-def describe_image(image_path):
+def _describe_prepared(image):
+    response = vision_client.chat.completions.create(
+        model=VISION_MODEL,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": VISION_PROMPT},
+                image_content(image)
+            ],
+        }],
+        max_tokens=300
+    )
+    return response.choices[0].message.content
+
+def describe_image(image):
     """
-    Converts an image file into a technical text description.
+    Converts an image into a technical text description.
     This allows the 'Chatbot' to search for visual data in the PDF.
+
+    Parameters:
+    - image: A file path, the encoded image bytes, or the output of
+             rag.image_pipeline.prepare_image. Paths and bytes are
+             downscaled in memory first (see prepare_image).
     """
+    label = os.path.basename(image) if isinstance(image, str) else "image"
     try:
-        # Convert binary image data to Base64 string for OpenAI's API
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-
-        # Request a technical analysis focused on searchable labels and data
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Describe this image technically. Focus on text, labels, and data points for RAG retrieval."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                ],
-            }],
-            max_tokens=300
-        )
-        return response.choices[0].message.content
+        return _describe_prepared(_prepare(image))
     except Exception as e:
-        print(f"⚠️ vision error on {os.path.basename(image_path)}: {e}")
+        print(f"⚠️ vision error on {label}: {e}")
         return ""
 
-def process_images_parallel(image_paths, max_workers=5):
+# Batched captioning: several images share one request (and its prompt),
+# capped by count and by estimated image tokens to stay well inside the
+# per-request and per-minute limits.
+VISION_BATCH_SIZE = 4
+VISION_BATCH_MAX_TOKENS = 4000
+
+_BATCH_PROMPT = (
+    VISION_PROMPT + " You are given {n} images, each preceded by its label. "
+    'Reply with a JSON object {{"descriptions": [...]}} holding exactly one '
+    "description string per image, in the order the images were given."
+)
+
+def _prepare(image):
+    if isinstance(image, str):
+        with open(image, "rb") as image_file:
+            image = image_file.read()
+    if isinstance(image, (bytes, bytearray)):
+        image = prepare_image(bytes(image))
+    return image
+
+@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
+def _describe_batch_request(images):
+    content = [{"type": "text", "text": _BATCH_PROMPT.format(n=len(images))}]
+    for n, image in enumerate(images, start=1):
+        content.append({"type": "text", "text": f"Image {n}:"})
+        content.append(image_content(image))
+    response = vision_client.chat.completions.create(
+        model=VISION_MODEL,
+        messages=[{"role": "user", "content": content}],
+        response_format={"type": "json_object"},
+        max_tokens=300 * len(images)
+    )
+    return response.choices[0].message.content
+
+def _describe_batch(images):
+    """
+    One multi-image request. If the reply cannot be matched back to the
+    images, each image is described on its own instead.
+    """
+    if len(images) == 1:
+        return [describe_image(images[0])]
+    try:
+        descriptions = json.loads(_describe_batch_request(images)).get("descriptions")
+        if isinstance(descriptions, list) and len(descriptions) == len(images):
+            return [str(d).strip() for d in descriptions]
+        print(f"⚠️ vision batch returned {len(descriptions or [])} of {len(images)} descriptions; retrying one by one")
+    except Exception as e:
+        print(f"⚠️ vision batch error: {e}; retrying one by one")
+    return [describe_image(image) for image in images]
+
+def _pack_image_batches(images, batch_size, max_tokens):
+    batches, current, tokens = [], [], 0
+    for image in images:
+        if current and (len(current) >= batch_size or tokens + image["tokens"] > max_tokens):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(image)
+        tokens += image["tokens"]
+    if current:
+        batches.append(current)
+    return batches
+
+def describe_images(images, batch_size=VISION_BATCH_SIZE, max_workers=5):
+    """
+    Describes many images with as few requests as possible.
+
+    Parameters:
+    - images (list): Paths, bytes or prepared images (see describe_image).
+    - batch_size (int): Images per request; 1 sends one request per image.
+    - max_workers (int): Requests in flight at once.
+
+    Returns:
+    - list of str: One description per image, in input order ("" on failure).
+    """
+    prepared, slots = [], []
+    for i, image in enumerate(images):
+        try:
+            prepared.append(_prepare(image))
+            slots.append(i)
+        except Exception as e:
+            print(f"⚠️ vision error on image {i}: {e}")
+
+    if batch_size <= 1:
+        batches = [[image] for image in prepared]
+    else:
+        batches = _pack_image_batches(prepared, batch_size, VISION_BATCH_MAX_TOKENS)
+    run = (lambda batch: [describe_image(batch[0])]) if batch_size <= 1 else _describe_batch
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = [text for batch in executor.map(run, batches) for text in batch]
+
+    descriptions = [""] * len(images)
+    for i, text in zip(slots, results):
+        descriptions[i] = text
+    return descriptions
+
+def process_images_parallel(image_paths, max_workers=5, batch_size=VISION_BATCH_SIZE):
     """
     Performance Fix: Process multiple images at the same time using Threads.
     max_workers=5 keeps us within typical OpenAI 'Tier 1' rate limits.
+    Images are packed batch_size to a request (see describe_images).
     """
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        descriptions = list(executor.map(describe_image, image_paths))
-    return [d for d in descriptions if d]
+    return [d for d in describe_images(image_paths, batch_size, max_workers) if d]
+
+def describe_pdf_images(pdf_path, max_workers=5, triage=True, batch_size=VISION_BATCH_SIZE):
+    """
+    Captions the embedded images of a PDF without writing them to disk:
+    each image is read by xref, downscaled and sent as in-memory bytes.
+
+    With triage (see rag.image_pipeline.iter_pdf_images), duplicate,
+    decorative and text-covered images are skipped, and images described
+    before (in any document) are answered from rag.vision_cache. The rest
+    are sent batch_size to a request (see describe_images).
+
+    Returns:
+    - list of dict: {"page", "xref", "text"} for every described image.
+    """
+    report = {}
+    images = list(iter_pdf_images(pdf_path, triage=triage, report=report))
+
+    # --- CACHED DESCRIPTIONS ---
+    cached = get_cached_descriptions([img["sha256"] for img in images], VISION_MODEL, _VISION_PROMPT_HASH)
+    report["cached"] = sum(1 for img in images if img["sha256"] in cached)
+
+    to_describe, prepared = [], []
+    for img in images:
+        if img["sha256"] in cached:
+            continue
+        try:
+            prepared.append(prepare_image(img["data"]))
+            to_describe.append(img)
+        except Exception as e:
+            print(f"⚠️ Skipping unreadable image (xref {img['xref']}): {e}")
+
+    elapsed = 0.0
+    if prepared:
+        t0 = time.perf_counter()
+        texts = describe_images(prepared, batch_size, max_workers)
+        elapsed = time.perf_counter() - t0
+        fresh = {img["sha256"]: text for img, text in zip(to_describe, texts)}
+        store_descriptions(fresh, VISION_MODEL, _VISION_PROMPT_HASH)
+        cached.update({h: text for h, text in fresh.items() if text})
+
+    # --- REPORT ---
+    name = os.path.basename(pdf_path)
+    avoided = report["cached"] + sum(report[reason] for reason in TRIAGE_REASONS)
+    skipped = ", ".join(f"{report[r]} {r.replace('_', ' ')}" for r in (*TRIAGE_REASONS, "cached") if report[r])
+    requests = len(prepared) if batch_size <= 1 else len(
+        _pack_image_batches(prepared, batch_size, VISION_BATCH_MAX_TOKENS))
+    print(f"🖼️  {name}: {report['images']} images, {len(prepared)} described in {requests} vision calls, "
+          f"{avoided} avoided" + (f" ({skipped})" if skipped else ""))
+    if prepared:
+        sent = sum(len(p["data"]) for p in prepared)
+        source = sum(p["source_bytes"] for p in prepared)
+        print(f"   {source / 1024:.0f} KB → {sent / 1024:.0f} KB uploaded, "
+              f"~{sum(p['source_tokens'] for p in prepared)} → ~{sum(p['tokens'] for p in prepared)} vision tokens, "
+              f"{elapsed:.1f} s")
+
+    return [
+        {"page": img["page"], "xref": img["xref"], "text": cached[img["sha256"]]}
+        for img in images if cached.get(img["sha256"])
+    ]
 
 # =================================================================
 # 3. EMBEDDING OPTIMIZATION (Text to Math)
 # =================================================================
 
-def embed_texts(texts):
+# Per-request ceilings. The API allows 2048 inputs and roughly 300k tokens
+# per call; staying well below keeps single requests fast and retry-cheap.
+MAX_BATCH_ITEMS = 512
+MAX_BATCH_TOKENS = 100_000
+MAX_CONCURRENT_BATCHES = 4
+
+_EMPTY = np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+
+def _pack_batches(texts, max_items, max_tokens):
+    """
+    Splits texts into contiguous (start, end) slices that respect both the
+    item and the token ceiling. Contiguous slices keep input order trivial.
+    """
+    # One text is one request whatever its size (a query, typically), so
+    # it is not worth tokenizing.
+    if len(texts) <= 1:
+        return [(0, len(texts))] if texts else []
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, n_tokens in enumerate(count_tokens_batch(texts)):
+        if i > start and (i - start >= max_items or batch_tokens + n_tokens > max_tokens):
+            batches.append((start, i))
+            start, batch_tokens = i, 0
+        batch_tokens += n_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
+def _embed_batch(batch):
+    """
+    One embeddings request. Retried on its own, so a rate-limited batch
+    does not restart the batches that already succeeded.
+    """
+    # base64 ships the raw little-endian float32 bytes: smaller on the wire
+    # and no JSON float parsing.
+    resp = client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=batch,
+        dimensions=EMBEDDING_DIMENSIONS,
+        encoding_format="base64"
+    )
+    # The API tags each vector with its input index; sort to be safe.
+    raw = b"".join(base64.b64decode(item.embedding) for item in sorted(resp.data, key=lambda d: d.index))
+    return np.frombuffer(raw, dtype=np.float32).reshape(len(batch), -1)
+
+def _embed_and_cache(batch):
     """
-    Converts a list of text strings into numerical vectors (Arrays).
-    Optimized for batching: One API call handles multiple text chunks.
+    Embeds one batch and caches it right away, so vectors that were paid
+    for survive a crash or Ctrl-C later in the same run.
+    """
+    vectors = _embed_batch(batch)
+    store_embeddings(batch, vectors, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    return vectors
+
+def embed_texts(texts, max_items=MAX_BATCH_ITEMS, max_tokens=MAX_BATCH_TOKENS,
+                max_workers=MAX_CONCURRENT_BATCHES):
+    """
+    Converts a list of text strings into numerical vectors.
+    Optimized for batching: inputs are packed into requests under the item
+    and token ceilings, and up to max_workers requests run concurrently.
+
+    Returns:
+    - np.ndarray: One contiguous float32 matrix of shape (n, d), rows in
+      input order. Empty (0 rows) when there is nothing to embed or on failure.
     """
     # Clean input: Ignore empty strings or non-string data
     clean_texts = [str(t).strip() for t in texts if t and str(t).strip()]
     if not clean_texts:
-        return []
+        return _EMPTY
     
+    # --- CACHE LOOKUP ---
+    # Identical text (re-synced files, shared boilerplate, repeated
+    # questions) is only ever paid for once.
+    vectors = get_cached_embeddings(clean_texts, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    missing = [i for i in range(len(clean_texts)) if i not in vectors]
+    if not missing:
+        return np.stack([vectors[i] for i in range(len(clean_texts))])
+
     try:
-        # Generate embeddings using the latest, most efficient OpenAI model
-        resp = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=clean_texts
-        )
-        # Convert the results into a list of Numpy arrays for the database
-        return [np.array(item.embedding) for item in resp.data]
+        to_embed = [clean_texts[i] for i in missing]
+        batches = _pack_batches(to_embed, max_items, max_tokens)
+        # executor.map yields results in submission order, whatever the
+        # order in which the requests actually complete.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fresh = np.concatenate(list(executor.map(_embed_and_cache, [to_embed[a:b] for a, b in batches])))
+
+        # --- ASSEMBLY ---
+        # Fresh rows and cache hits are written straight into one matrix.
+        matrix = np.empty((len(clean_texts), fresh.shape[1]), dtype=np.float32)
+        matrix[missing] = fresh
+        for i, vector in vectors.items():
+            matrix[i] = vector
+        return matrix
     except Exception as e:
         print(f"❌ Critical Embedding Failure: {e}")
-        return []
+        return _EMPTY
 
 # =================================================================
 # 4. VECTOR DATABASE PERSISTENCE (ChromaDB Sync)
 # =================================================================
 
-def sync_to_chroma(collection, chunks, filename):
+def _chunk_ids(filename, hashes):
     """
-    The Bridge: Connects processed chunks to the ChromaDB Collection.
-    Includes logic to prevent duplicate data from being indexed.
+    Content-derived IDs: the same chunk text always maps to the same ID,
+    so unchanged chunks are recognised no matter where they moved.
+    Repeats of a chunk inside one file get an occurrence suffix.
+    """
+    seen = {}
+    ids = []
+    for h in hashes:
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        ids.append(f"{filename}_{h[:16]}" + (f"_{n}" if n else ""))
+    return ids
+
+def plan_sync(collection, chunks, filename, source_path=None, file_state=None):
+    """
+    Works out what a sync has to do, without embedding or writing anything.
+
+    The ingestion manifest is checked first, so re-planning an unchanged
+    chunk set never reads the vector store.
+
+    file_state (manifest.file_state() taken before extraction) is what the
+    manifest records for the file; with only source_path it is taken here.
+
+    Returns:
+    - dict or None: None when the source is already up to date, otherwise
+      a plan with the chunk texts, IDs and metadata plus the row numbers
+      that are new ("new_rows") or moved ("moved_rows"), the IDs to delete,
+      and the near-duplicate rows ("duplicates": {row: (canonical id,
+      similarity)}) that are stored as references instead of vectors, of
+      which "new_duplicate_rows" were found by this sync.
     """
-    # --- STEP 1: DUPLICATE CHECK ---
-    # We query the DB by the 'source' filename. If it exists, we skip processing
-    # to save time and API costs.
-    existing = collection.get(where={"source": filename})
-    if existing and len(existing['ids']) > 0:
+    # Layout chunks carry their own metadata; plain strings carry none.
+    # Blank chunks are dropped here, since embed_texts would skip them anyway.
+    pairs = [(c["text"], c["metadata"]) if isinstance(c, dict) else (c, {}) for c in chunks]
+    pairs = [(text, meta) for text, meta in pairs if text and text.strip()]
+    chunks = [text for text, _ in pairs]
+    if file_state is None and source_path:
+        file_state = manifest.file_state(source_path)
+
+    hashes = [hashlib.sha256(text.strip().encode("utf-8")).hexdigest() for text in chunks]
+    ids = _chunk_ids(filename, hashes)
+    metadatas = [
+        {"source": filename, "chunk_hash": h, "chunk_index": i, **meta}
+        for i, (h, (_, meta)) in enumerate(zip(hashes, pairs))
+    ]
+
+    # --- STEP 0: MANIFEST CHECK ---
+    # One digest over IDs + metadata describes the whole chunk set.
+    chunks_hash = hashlib.sha256(
+        json.dumps([ids, metadatas], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    entry = manifest.get_entry(collection, filename)
+    if entry and entry["chunks_hash"] == chunks_hash:
         print(f"⏩ {filename} is already in the database. Moving on.")
+        return None
+
+    # --- STEP 1: DIFF AGAINST THE STORED VERSION ---
+    # Only IDs and metadata are fetched, never documents or vectors.
+    existing = collection.get(where={"source": filename}, include=["metadatas"])
+    stored = dict(zip(existing["ids"], existing["metadatas"])) if existing else {}
+
+    kept_rows = [i for i, chunk_id in enumerate(ids) if chunk_id in stored]
+    stale_ids = list(set(stored) - set(ids))
+
+    # Near-duplicates from earlier syncs exist only as references. One whose
+    # canonical row this sync deletes would point at nothing, so its chunk
+    # is matched (or embedded) again like a new one.
+    collection_id = str(collection.id)
+    references = dedup.get_references(collection_id, filename)
+    stale = set(stale_ids)
+    duplicates = {
+        i: references[chunk_id] for i, chunk_id in enumerate(ids)
+        if chunk_id not in stored and chunk_id in references and references[chunk_id][0] not in stale
+    }
+    new_rows = [i for i, chunk_id in enumerate(ids) if chunk_id not in stored and i not in duplicates]
+
+    # --- STEP 1b: NEAR-DUPLICATES ---
+    # Chunks close to one already indexed (here or in another document) are
+    # recorded as references to it instead of getting their own vector.
+    matches = dedup.find_duplicates(
+        collection_id, [(ids[i], chunks[i]) for i in new_rows], exclude=stale_ids
+    )
+    new_duplicate_rows = [i for i in new_rows if ids[i] in matches]
+    duplicates.update({i: matches[ids[i]] for i in new_duplicate_rows})
+    new_rows = [i for i in new_rows if ids[i] not in matches]
+
+    # Unchanged chunks may still have moved (new page number or position).
+    moved_rows = [
+        i for i in kept_rows
+        if any(stored[ids[i]].get(key) != value for key, value in metadatas[i].items())
+    ]
+
+    return {
+        "filename": filename,
+        "file_state": file_state,
+        "chunks_hash": chunks_hash,
+        "chunks": chunks,
+        "ids": ids,
+        "metadatas": metadatas,
+        "stored": stored,
+        "new_rows": new_rows,
+        "kept_rows": kept_rows,
+        "moved_rows": moved_rows,
+        "stale_ids": stale_ids,
+        "duplicates": duplicates,
+        "new_duplicates": len(new_duplicate_rows),
+        "new_duplicate_rows": new_duplicate_rows,
+        "stale_references": len(set(references) - set(ids)),
+    }
+
+# Chunks embedded and written per step in sync_to_chroma, and how many
+# embedded-but-unwritten steps may wait in memory.
+SYNC_BATCH_SIZE = 256
+SYNC_MAX_IN_FLIGHT = 2
+
+def write_rows(collection, plan, rows, vectors):
+    """
+    Adds some of a plan's new rows (with their vectors) to the collection.
+
+    Parameters:
+    - collection: The ChromaDB collection.
+    - plan (dict): Output of plan_sync.
+    - rows (list of int): A subset of plan["new_rows"].
+    - vectors (np.ndarray): Embeddings for those rows, in the same order.
+    """
+    chunks, ids, metadatas = plan["chunks"], plan["ids"], plan["metadatas"]
+
+    # The float32 matrix is handed over as-is, without per-row Python lists,
+    # split so no single add exceeds what the client accepts.
+    now = time.time()
+    step = CHROMA_MAX_ADD_BATCH
+    for start in range(0, len(rows), step):
+        part = rows[start:start + step]
+        collection.add(
+            embeddings=vectors[start:start + step],
+            documents=[chunks[i] for i in part],
+            metadatas=[{**metadatas[i], "indexed_at": now} for i in part],
+            ids=[ids[i] for i in part]
+        )
+    manifest.bump_collection_version(collection.name)
+    dedup.add_signatures(str(collection.id), [(ids[i], chunks[i]) for i in rows])
+
+def finish_sync(collection, plan):
+    """
+    Metadata-only updates, removal of stale rows and the manifest record.
+    Called once all new rows of the plan have been written.
+    """
+    ids, metadatas, stored = plan["ids"], plan["metadatas"], plan["stored"]
+    moved_rows, stale_ids = plan["moved_rows"], plan["stale_ids"]
+
+    # Stale rows are removed last, so an interrupted sync leaves extra
+    # rows behind rather than missing ones.
+    if moved_rows:
+        collection.update(
+            ids=[ids[i] for i in moved_rows],
+            metadatas=[{**stored[ids[i]], **metadatas[i]} for i in moved_rows]
+        )
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+        # Other documents that referenced a deleted row are no longer
+        # covered by any vector; make their next ingestion re-sync them.
+        for source in dedup.forget_chunks(str(collection.id), stale_ids) - {plan["filename"]}:
+            manifest.forget(collection, source)
+
+    # Bumped after the writes, so a query racing this sync cannot cache
+    # pre-sync results under the new version.
+    if moved_rows or stale_ids:
+        manifest.bump_collection_version(collection.name)
+
+    dedup.set_references(str(collection.id), plan["filename"], [
+        {"chunk_id": ids[i], "canonical_id": canonical_id, "similarity": score,
+         "text": plan["chunks"][i], "metadata": metadatas[i]}
+        for i, (canonical_id, score) in plan["duplicates"].items()
+    ])
+    manifest.record(collection, plan["filename"], plan["chunks_hash"], len(plan["chunks"]), plan["file_state"])
+
+def apply_sync(collection, plan, vectors):
+    """
+    Writes a plan from plan_sync to the collection in one go.
+
+    Parameters:
+    - collection: The ChromaDB collection.
+    - plan (dict): Output of plan_sync.
+    - vectors (np.ndarray): Embeddings for plan["new_rows"], in that order.
+    """
+    # --- STEP 3: INSERTION ---
+    if plan["new_rows"]:
+        write_rows(collection, plan, plan["new_rows"], vectors)
+
+    # --- STEP 4: METADATA-ONLY UPDATES & CLEANUP ---
+    finish_sync(collection, plan)
+
+def sync_to_chroma(collection, chunks, filename, source_path=None, file_state=None,
+                   batch_size=SYNC_BATCH_SIZE, max_in_flight=SYNC_MAX_IN_FLIGHT):
+    """
+    The Bridge: Connects processed chunks to the ChromaDB Collection.
+
+    Incremental: every chunk is stored with a content hash, and a re-sync
+    only embeds chunks that are new, deletes chunks that disappeared and
+    leaves unchanged vectors alone. With rag.chunker.iter_layout_chunks
+    (which restarts at every page and heading) editing one page therefore
+    costs about one page of embeddings.
+
+    Pipelined: new chunks are embedded batch_size at a time on a producer
+    thread while the previous batch is written, and at most max_in_flight
+    embedded batches wait for the writer, so memory follows the batch size
+    rather than the file size.
+
+    chunks may be plain strings (chunk_text) or the dicts produced by
+    rag.chunker.iter_layout_chunks, whose page/offset metadata is stored
+    alongside each vector for citations.
+
+    Pass source_path, or better the file_state taken before extraction, to
+    also record the file's hash, size and mtime in the ingestion manifest
+    for whole-file skips.
+    """
+    plan = plan_sync(collection, chunks, filename, source_path, file_state)
+    if plan is None:
         return
 
-    print(f"⚙️  Processing new knowledge: {filename}...")
-    
-    # --- STEP 2: BATCH EMBEDDING ---
-    # Convert all text chunks for this file into vectors in one batch
-    vectors = embed_texts(chunks)
-    
-    if not vectors:
+    filename, new_rows = plan["filename"], plan["new_rows"]
+    if not (new_rows or plan["stale_ids"] or plan["moved_rows"]
+            or plan["new_duplicates"] or plan["stale_references"]):
+        apply_sync(collection, plan, None)
+        print(f"⏩ {filename} is unchanged. Moving on.")
         return
 
-    # --- STEP 3: METADATA PREPARATION ---
-    # metadata allows the AI to filter searches (e.g., only look in 'policy.pdf')
-    ids = [f"{filename}_{i}" for i in range(len(chunks))]
-    metadatas = [{"source": filename, "indexed_at": time.time()} for _ in chunks]
-    
-    # --- STEP 4: INSERTION ---
-    # Add vectors, original text, and metadata to the persistent storage
-    collection.add(
-        embeddings=[v.tolist() for v in vectors],
-        documents=chunks,
-        metadatas=metadatas,
-        ids=ids
-    )
-    print(f"✅ {filename} successfully indexed with {len(chunks)} chunks.")
\ No newline at end of file
+    print(f"⚙️  Syncing {filename}: {len(new_rows)} new, {len(plan['stale_ids'])} removed, "
+          f"{len(plan['kept_rows'])} unchanged chunks...")
+    if plan["new_duplicates"]:
+        saved = sum(len(plan["chunks"][i].encode("utf-8")) for i in plan["new_duplicate_rows"])
+        print(f"♻️  {plan['new_duplicates']} near-duplicate chunks stored as references "
+              f"({saved / 1024:.1f} KB, {plan['new_duplicates']} embeddings saved)")
+
+    # --- STEP 2: EMBED (producer) WHILE WRITING (consumer) ---
+    # Only new chunks are embedded. A None on the queue ends the stream;
+    # an empty matrix means embedding failed.
+    embedded = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for start in range(0, len(new_rows), batch_size):
+                if stop.is_set():
+                    return
+                rows = new_rows[start:start + batch_size]
+                vectors = embed_texts([plan["chunks"][i] for i in rows])
+                embedded.put((rows, vectors))
+                if len(vectors) == 0:
+                    return
+        finally:
+            embedded.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while (item := embedded.get()) is not None:
+            rows, vectors = item
+            if len(vectors) == 0:
+                # Rows written so far stay; the next sync's diff skips them.
+                return
+            write_rows(collection, plan, rows, vectors)
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue, then let it finish.
+        while producer.is_alive():
+            try:
+                embedded.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+
+    # --- STEP 3: METADATA-ONLY UPDATES & CLEANUP ---
+    finish_sync(collection, plan)
+    print(f"✅ {filename} synced: {len(plan['chunks'])} chunks indexed, {len(new_rows)} embedded.")
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+from contextlib import closing
+
+# =================================================================
+# CONTENT-ADDRESSED EXTRACTION CACHE
+# =================================================================
+
+# Keyed by the SHA-256 of the PDF bytes (plus the extractor version), so
+# renamed or copied files hit the cache, edited files miss it, and so do
+# files cached by an older extractor. Lives next to the other runtime data.
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "extraction_cache.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    sha256      TEXT PRIMARY KEY,
+    page_count  INTEGER NOT NULL,
+    has_blocks  INTEGER NOT NULL DEFAULT 0,
+    cached_at   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    sha256      TEXT NOT NULL,
+    page_no     INTEGER NOT NULL,
+    text        BLOB NOT NULL,
+    images      TEXT NOT NULL,
+    blocks      BLOB,
+    PRIMARY KEY (sha256, page_no)
+);
+"""
+
+def _connect():
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _pack(value):
+    return zlib.compress(json.dumps(value).encode("utf-8"))
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Hashes a file in 1 MB blocks so large brochures never sit in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_document(cache_key, need_blocks=False):
+    """
+    Returns the cached pages of a document, or None on a cache miss.
+
+    Parameters:
+    - cache_key (str): Content hash of the PDF file plus the extractor
+                       version (see rag.pdf_loader).
+    - need_blocks (bool): Only count it as a hit if layout blocks are cached too.
+
+    Returns:
+    - iterator of dict: One {"page_no", "text", "images", "blocks"} per page,
+      in page order ("blocks" is None when only text was cached). Pages are
+      read from SQLite one at a time, never the whole document at once.
+    """
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT page_count, has_blocks FROM documents WHERE sha256 = ?", (cache_key,)
+            ).fetchone()
+            if row is None or (need_blocks and not row[1]):
+                return None
+            (stored,) = conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE sha256 = ?", (cache_key,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Extraction cache unavailable: {e}")
+        return None
+
+    # A partially written document is treated as a miss.
+    if stored != row[0]:
+        return None
+    return _iter_pages(cache_key, row[0])
+
+def _iter_pages(cache_key, page_count):
+    read = 0
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT page_no, text, images, blocks FROM pages WHERE sha256 = ? ORDER BY page_no",
+            (cache_key,)
+        )
+        for page_no, text, images, blocks in rows:
+            read += 1
+            yield {
+                "page_no": page_no,
+                "text": zlib.decompress(text).decode("utf-8"),
+                "images": json.loads(images),
+                "blocks": _unpack(blocks) if blocks is not None else None,
+            }
+    # Another process rewrote the entry while we read it; never pass a
+    # truncated document off as complete.
+    if read != page_count:
+        raise RuntimeError("extraction cache entry changed while it was being read")
+
+class DocumentWriter:
+    """
+    Streams a document's pages into the cache as they are extracted, so a
+    large PDF is never held in memory just to be cached.
+
+    Pages are buffered and written WRITE_EVERY at a time, each group in one
+    short transaction. No transaction is ever left open while the caller
+    extracts the next page, so parallel ingest workers never wait on each
+    other's extraction for the write lock. The document only becomes a hit
+    when the `with` block exits normally, so an interrupted or failed
+    extraction leaves a miss behind.
+
+        with DocumentWriter(cache_key) as writer:
+            for page in pages:
+                writer.add(page)
+    """
+
+    WRITE_EVERY = 16
+
+    def __init__(self, cache_key):
+        self.cache_key = cache_key
+        self.conn = None
+        self.rows = []
+        self.page_count = 0
+        self.has_blocks = True
+
+    def __enter__(self):
+        try:
+            self.conn = _connect()
+            with self.conn:
+                self.conn.execute("DELETE FROM documents WHERE sha256 = ?", (self.cache_key,))
+                self.conn.execute("DELETE FROM pages WHERE sha256 = ?", (self.cache_key,))
+        except sqlite3.Error as e:
+            self._fail(e)
+        return self
+
+    def _fail(self, error):
+        print(f"⚠️ Could not write extraction cache: {error}")
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+        self.rows = []
+
+    def _flush(self, finish=False):
+        """
+        Writes the buffered pages (and, with finish, the document row) in
+        one transaction.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pages (sha256, page_no, text, images, blocks) VALUES (?, ?, ?, ?, ?)",
+                self.rows
+            )
+            if finish:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO documents (sha256, page_count, has_blocks, cached_at) VALUES (?, ?, ?, ?)",
+                    (self.cache_key, self.page_count, int(self.has_blocks), time.time())
+                )
+        self.rows = []
+
+    def add(self, page):
+        """
+        Stores one {"page_no", "text", "images", "blocks"} page; "blocks" may be None.
+        """
+        if self.conn is None:
+            return
+        self.page_count += 1
+        self.has_blocks = self.has_blocks and page.get("blocks") is not None
+        self.rows.append((
+            self.cache_key,
+            page["page_no"],
+            zlib.compress(page["text"].encode("utf-8")),
+            json.dumps(page["images"]),
+            _pack(page["blocks"]) if page.get("blocks") is not None else None,
+        ))
+        if len(self.rows) >= self.WRITE_EVERY:
+            try:
+                self._flush()
+            except sqlite3.Error as e:
+                self._fail(e)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn is None:
+            return False
+        try:
+            # An interrupted pass is dropped: its pages would never be read.
+            if exc_type is None:
+                self._flush(finish=True)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not write extraction cache: {e}")
+        finally:
+            self.conn.close()
+            self.conn = None
+            self.rows = []
+        return False
@@ -0,0 +1,245 @@
+import math
+import base64
+import hashlib
+import pymupdf
+import numpy as np
+
+# =================================================================
+# IMAGE PIPELINE: PDF → MEMORY → DOWNSCALED BYTES → VISION REQUEST
+# =================================================================
+# Embedded images are read straight out of the PDF by xref, resized and
+# re-encoded with PyMuPDF, and sent as a data URL. Nothing touches disk,
+# and the vision model never receives more pixels than it will look at.
+
+# Long-side limit for "high" detail. The API scales high-detail images to
+# a 768 px short side and bills 170 tokens per 512 px tile, so a 4000 px
+# scan costs the same as a ~1500 px copy; 1024 keeps labels legible.
+VISION_MAX_SIDE = 1024
+
+# Images that already fit in one 512 px tile gain nothing from "high"
+# detail, which would bill an extra tile on top of the 85 base tokens.
+LOW_DETAIL_MAX_SIDE = 512
+
+JPEG_QUALITY = 80
+
+# Formats the vision endpoint accepts as-is.
+_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+def sniff_mime(data):
+    """
+    MIME type from the file signature, or None for formats the vision
+    endpoint does not accept directly (JPX, JBIG2, TIFF, ...).
+    """
+    for magic, mime in _MAGIC:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+def vision_tokens(width, height, detail):
+    """
+    Estimated prompt tokens for one image at the given detail level.
+    """
+    if detail == "low":
+        return 85
+    # Fit inside 2048x2048, then scale the short side down to 768.
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def prepare_image(data, max_side=VISION_MAX_SIDE, detail="auto"):
+    """
+    Downscales and re-encodes one image in memory for a vision request.
+
+    Parameters:
+    - data (bytes): The encoded image (any format PyMuPDF can read).
+    - max_side (int): Long-side limit for "high" detail.
+    - detail (str): "low", "high" or "auto" (low when the image already
+                    fits LOW_DETAIL_MAX_SIDE).
+
+    Returns:
+    - dict: {"data", "mime", "width", "height", "detail",
+             "source_bytes", "source_tokens", "tokens"}.
+    """
+    pix = pymupdf.Pixmap(data)
+    width, height, source_bytes = pix.width, pix.height, len(data)
+    if detail == "auto":
+        detail = "low" if max(width, height) <= LOW_DETAIL_MAX_SIDE else "high"
+    limit = LOW_DETAIL_MAX_SIDE if detail == "low" else max_side
+
+    mime = sniff_mime(data)
+    if mime is None or max(width, height) > limit:
+        # JPEG has no alpha channel and expects gray or RGB samples.
+        if pix.alpha:
+            pix = pymupdf.Pixmap(pix, 0)
+        if pix.n not in (1, 3):
+            pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+        scale = min(1.0, limit / max(width, height))
+        if scale < 1.0:
+            pix = pymupdf.Pixmap(pix, max(1, round(width * scale)), max(1, round(height * scale)), None)
+        data, mime = pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY), "image/jpeg"
+
+    return {
+        "data": data,
+        "mime": mime,
+        "width": pix.width,
+        "height": pix.height,
+        "detail": detail,
+        "source_bytes": source_bytes,
+        "source_tokens": vision_tokens(width, height, "high"),
+        "tokens": vision_tokens(pix.width, pix.height, detail),
+    }
+
+def image_content(image):
+    """
+    The chat-completions content part for a prepared image.
+    """
+    encoded = base64.b64encode(image["data"]).decode("ascii")
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:{image['mime']};base64,{encoded}", "detail": image["detail"]},
+    }
+
+# =================================================================
+# TRIAGE: SKIP IMAGES NOT WORTH A VISION CALL
+# =================================================================
+
+# Icons, bullets and spacer graphics.
+MIN_IMAGE_SIDE = 64
+# Shannon entropy (bits, 0-8) of the grayscale histogram. Flat fills,
+# rules and two-tone backgrounds score below this.
+MIN_IMAGE_ENTROPY = 2.0
+# Difference-hash distance (of 64 bits) at which two images count as the
+# same picture re-encoded, re-sized or slightly re-coloured.
+PHASH_MAX_DISTANCE = 4
+# Share of the image's area already covered by extractable text (e.g. a
+# scanned page with an OCR layer, or a text box exported as a picture).
+TEXT_COVERAGE_SKIP = 0.5
+
+TRIAGE_REASONS = ("duplicate", "near_duplicate", "tiny", "low_entropy", "covered_by_text")
+
+def _gray(pix, width, height):
+    """
+    Grayscale samples resized to width x height, as a uint8 array.
+    """
+    if pix.alpha:
+        pix = pymupdf.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = pymupdf.Pixmap(pymupdf.csGRAY, pix)
+    small = pymupdf.Pixmap(pix, width, height, None)
+    return np.frombuffer(small.samples, dtype=np.uint8).reshape(small.height, small.stride)[:, :small.width]
+
+def image_entropy(pix):
+    """
+    Entropy (bits) of the grayscale histogram of a 64x64 thumbnail.
+    """
+    counts = np.bincount(_gray(pix, 64, 64).ravel(), minlength=256)
+    p = counts[counts > 0] / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+def perceptual_hash(pix):
+    """
+    64-bit difference hash: brightness gradients of a 9x8 thumbnail.
+    """
+    small = _gray(pix, 9, 8).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+def _text_coverage(rect, text_rects):
+    if rect.is_empty:
+        return 0.0
+    covered = sum(abs(rect & t) for t in text_rects)
+    return min(1.0, covered / abs(rect))
+
+def iter_pdf_images(pdf_path, triage=True, report=None):
+    """
+    Yields the embedded images of a PDF, read into memory by xref.
+
+    An image drawn on several pages is extracted once and yielded for
+    its first page only. With triage, images that would waste a vision
+    call are skipped as well: byte-identical or perceptually identical
+    copies under another xref, tiny or low-entropy (decorative) images,
+    and images mostly covered by extractable text.
+
+    Parameters:
+    - pdf_path (str): The system path to the PDF file.
+    - triage (bool): Apply the skip rules above (xref de-duplication
+                     always applies).
+    - report (dict): Optional; counts skipped images per reason
+                     (see TRIAGE_REASONS) plus "images" seen in total.
+
+    Yields:
+    - dict: {"page", "xref", "width", "height", "data", "sha256"}.
+    """
+    report = report if report is not None else {}
+    for key in ("images", *TRIAGE_REASONS):
+        report.setdefault(key, 0)
+    seen_xrefs, seen_hashes, seen_phashes = set(), set(), []
+
+    with pymupdf.open(pdf_path) as doc:
+        for page_no, page in enumerate(doc, start=1):
+            text_rects = None
+            for img in page.get_images(full=True):
+                xref, width, height = img[0], img[2], img[3]
+                report["images"] += 1
+                if xref in seen_xrefs:
+                    report["duplicate"] += 1
+                    continue
+                seen_xrefs.add(xref)
+
+                # --- CHEAP CHECKS (no pixel data read) ---
+                if triage and min(width, height) < MIN_IMAGE_SIDE:
+                    report["tiny"] += 1
+                    continue
+                if triage:
+                    if text_rects is None:
+                        text_rects = [pymupdf.Rect(b[:4]) for b in page.get_text("blocks") if b[6] == 0]
+                    rects = page.get_image_rects(xref)
+                    if text_rects and rects and all(
+                        _text_coverage(r, text_rects) >= TEXT_COVERAGE_SKIP for r in rects
+                    ):
+                        report["covered_by_text"] += 1
+                        continue
+
+                extracted = doc.extract_image(xref)
+                if not extracted:
+                    continue
+                data = extracted["image"]
+                sha256 = hashlib.sha256(data).hexdigest()
+
+                # --- CONTENT CHECKS ---
+                if triage:
+                    if sha256 in seen_hashes:
+                        report["duplicate"] += 1
+                        continue
+                    seen_hashes.add(sha256)
+                    try:
+                        pix = pymupdf.Pixmap(data)
+                        entropy, phash = image_entropy(pix), perceptual_hash(pix)
+                    except Exception:
+                        entropy, phash = None, None
+                    if entropy is not None and entropy < MIN_IMAGE_ENTROPY:
+                        report["low_entropy"] += 1
+                        continue
+                    if phash is not None:
+                        if any(bin(phash ^ other).count("1") <= PHASH_MAX_DISTANCE for other in seen_phashes):
+                            report["near_duplicate"] += 1
+                            continue
+                        seen_phashes.append(phash)
+
+                yield {
+                    "page": page_no,
+                    "xref": xref,
+                    "width": extracted["width"],
+                    "height": extracted["height"],
+                    "data": data,
+                    "sha256": sha256,
+                }
@@ -1,5 +1,5 @@
-import base64
-from openai import OpenAI
+from rag.openai_client import get_client
+from rag.image_pipeline import prepare_image, image_content
 
 # =================================================================
 # VISION UTILITY: IMAGE-TO-TEXT CONVERSION
@@ -18,17 +18,17 @@ def describe_image(image_path, api_key):
     - api_key (str): The OpenAI API key for authentication.
     """
     
-    # 1. INITIALIZE CLIENT
-    # We initialize the client inside the function to ensure the API key 
-    # is always fresh and scope-specific.
-    client = OpenAI(api_key=api_key)
+    # 1. CLIENT
+    # The shared client (rag.openai_client), so consecutive images reuse
+    # the same HTTP connections instead of opening new ones.
+    client = get_client("vision", api_key)
 
     # 2. IMAGE ENCODING
-    # OpenAI's Vision API requires images to be sent as Base64 strings.
-    # We open the image in 'rb' (read binary) mode, encode it, and 
-    # convert it to a UTF-8 string.
+    # The file is read into memory, downscaled to what the vision model
+    # actually looks at and re-encoded. The data URL carries the real
+    # MIME type instead of always claiming JPEG.
     with open(image_path, "rb") as image_file:
-        encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
+        image = prepare_image(image_file.read())
 
     # 3. MULTI-MODAL API CALL
     # We send both a text instruction (the prompt) and the image data.
@@ -42,10 +42,7 @@ def describe_image(image_path, api_key):
                         "type": "text", 
                         "text": "Describe this image in detail. If it is a chart, explain the data. If it is a diagram, explain the steps."
                     },
-                    {
-                        "type": "image_url", 
-                        "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}
-                    }
+                    image_content(image)
                 ],
             }
         ],
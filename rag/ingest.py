@@ -0,0 +1,325 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from rag import manifest
+from rag.journal import IngestJournal
+from rag.chunker import iter_chunks, iter_layout_chunks, iter_token_chunks
+from rag.pdf_loader import iter_pdf_pages, iter_pdf_blocks, print_furniture_report
+
+# =================================================================
+# INGESTION PIPELINE: LOAD → CHUNK → EMBED → STORE
+# =================================================================
+#
+#   python -m rag.ingest path/to/pdfs
+#
+# Stages run concurrently and are connected by bounded queues, so a slow
+# stage applies back-pressure instead of letting work pile up in memory:
+#   1. load + chunk   process pool (CPU-bound PyMuPDF parsing), started
+#                     with "spawn": forking a process that already runs
+#                     the threads below can deadlock the child
+#   2. embed          a few threads, each issuing concurrent API batches
+#   3. store          one writer thread, the only one writing to Chroma
+
+_DONE = object()
+
+# =================================================================
+# 1. LOAD + CHUNK (runs in worker processes)
+# =================================================================
+
+def load_and_chunk(path, chunker="layout", chunk_size=800, chunk_overlap=150, strip_furniture=True):
+    """
+    Extracts and chunks one PDF. Top-level so worker processes can pickle it.
+
+    The file is hashed once, before extraction; the hash keys the
+    extraction cache and is recorded in the manifest and journal.
+
+    Returns:
+    - tuple: (path, page_count, chunks, report, state); report holds the
+      furniture counts and, if the file could not be read to the end,
+      "error"; state is manifest.file_state() of the file.
+    """
+    report = {}
+    try:
+        state = manifest.file_state(path)
+    except OSError as e:
+        return path, 0, [], {"error": str(e)}, None
+    sha256 = state["content_hash"]
+
+    if chunker == "layout":
+        blocks = iter_pdf_blocks(path, strip_furniture=strip_furniture, report=report, sha256=sha256)
+        chunks = list(iter_layout_chunks(blocks, chunk_size))
+        page_count = max((c["metadata"]["page"] for c in chunks), default=0)
+        return path, page_count, chunks, report, state
+
+    page_count = 0
+    def pages():
+        nonlocal page_count
+        for page_count, text in iter_pdf_pages(path, strip_furniture=strip_furniture, report=report, sha256=sha256):
+            yield text
+
+    if chunker == "tokens":
+        # chunk_size/chunk_overlap are interpreted as model tokens here.
+        chunks = list(iter_token_chunks(pages(), chunk_size, chunk_overlap))
+    else:
+        chunks = list(iter_chunks(pages(), chunk_size, chunk_overlap))
+    return path, page_count, chunks, report, state
+
+# =================================================================
+# 2. LIVE THROUGHPUT
+# =================================================================
+
+class _Stats:
+    """
+    Thread-safe counters plus a background printer for live rates.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"files": 0, "failed": 0, "pages": 0, "chunks": 0, "embeddings": 0,
+                       "duplicates": 0, "duplicate_bytes": 0, "furniture_chars": 0}
+        self.started = time.perf_counter()
+        self.stopped = threading.Event()
+
+    def add(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.counts[key] += value
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        with self.lock:
+            c = dict(self.counts)
+        return (f"📈 {c['files']} files | {c['pages'] / elapsed:6.1f} pages/s | "
+                f"{c['chunks'] / elapsed:6.1f} chunks/s | {c['embeddings'] / elapsed:6.1f} embeddings/s")
+
+    def run_printer(self, interval=1.0):
+        while not self.stopped.wait(interval):
+            sys.stdout.write("\r" + self.line())
+            sys.stdout.flush()
+
+# =================================================================
+# 3. PIPELINE
+# =================================================================
+
+def find_pdfs(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name)
+
+def source_name(path, directory):
+    """
+    The 'source' a file is stored under: its path relative to the ingest
+    root, so same-named files in different folders never overwrite each
+    other. Files directly in the root keep their plain file name.
+    """
+    return os.path.relpath(path, directory).replace(os.sep, "/")
+
+def run_pipeline(directory, collection, workers=None, embed_workers=2, chunker="layout",
+                 chunk_size=800, chunk_overlap=150, force=False, queue_size=8,
+                 commit_batch=256, resume=False, strip_furniture=True):
+    """
+    Ingests every PDF under `directory` into `collection`.
+
+    Parameters:
+    - directory (str): Folder searched recursively for *.pdf files. Each
+                       file is stored under its path relative to it.
+    - collection: The ChromaDB collection to write to.
+    - workers (int): Processes for extraction + chunking (default: CPU count).
+    - embed_workers (int): Documents embedded concurrently; each also sends
+                           its API batches concurrently (see embed_texts).
+    - chunker (str): "layout", "text" (characters) or "tokens".
+    - force (bool): Re-process files the manifest reports as unchanged.
+    - queue_size (int): Capacity of each inter-stage queue.
+    - commit_batch (int): Chunks per embed-and-write batch.
+    - resume (bool): Continue the previous, interrupted run. Files it
+                     completed (and that have not changed since) are
+                     skipped. Batches it wrote are found by the diff against
+                     the store and are not written again; vectors it paid
+                     for come from the embedding cache.
+    - strip_furniture (bool): Remove repeated headers, footers and page
+                              numbers before chunking (see rag.pdf_loader).
+    """
+    # Imported here: rag.embeddings needs an API key, the helpers above do not.
+    from rag.embeddings import plan_sync, write_rows, finish_sync, embed_texts
+
+    workers = workers or os.cpu_count() or 1
+    stats = _Stats()
+    journal = IngestJournal(resume=resume)
+    stop = threading.Event()
+    chunked = queue.Queue(maxsize=queue_size)
+    embedded = queue.Queue(maxsize=queue_size)
+
+    # --- STAGE 2: EMBED ---
+    # Each file is embedded in commit_batch-sized slices, so a crash loses
+    # at most the batches in flight, never a whole file.
+    def embed_stage():
+        while True:
+            item = chunked.get()
+            if item is _DONE:
+                break
+            if stop.is_set():
+                continue
+            path, chunks, state = item
+            try:
+                # The diff against the store skips rows committed by an
+                # earlier, interrupted run.
+                plan = plan_sync(collection, chunks, source_name(path, directory), file_state=state)
+                if plan is None:
+                    continue
+                stats.add(duplicates=plan["new_duplicates"], duplicate_bytes=sum(
+                    len(plan["chunks"][i].encode("utf-8")) for i in plan["new_duplicate_rows"]
+                ))
+                rows = plan["new_rows"]
+                batches = [rows[i:i + commit_batch] for i in range(0, len(rows), commit_batch)] or [[]]
+                for batch_no, batch_rows in enumerate(batches):
+                    if stop.is_set():
+                        break
+                    vectors = None
+                    if batch_rows:
+                        vectors = embed_texts([plan["chunks"][i] for i in batch_rows])
+                        if len(vectors) == 0:
+                            stats.add(failed=1)
+                            break
+                        stats.add(embeddings=len(vectors))
+                    embedded.put((plan, batch_rows, vectors, batch_no == len(batches) - 1))
+            except Exception as e:
+                stats.add(failed=1)
+                print(f"\n❌ Embedding failed for {path}: {e}")
+
+    # --- STAGE 3: STORE (single writer) ---
+    def store_stage():
+        failed = set()
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                break
+            plan, rows, vectors, is_last = item
+            if plan["filename"] in failed:
+                # A lost batch means the file is incomplete; leave it for --resume.
+                continue
+            try:
+                if rows:
+                    write_rows(collection, plan, rows, vectors)
+                if is_last:
+                    finish_sync(collection, plan)
+                    journal.file_done(plan["filename"], plan["file_state"]["content_hash"])
+                    stats.add(files=1)
+            except Exception as e:
+                failed.add(plan["filename"])
+                stats.add(failed=1)
+                print(f"\n❌ Write failed for {plan['filename']}: {e}")
+
+    embedders = [threading.Thread(target=embed_stage, daemon=True) for _ in range(embed_workers)]
+    writer = threading.Thread(target=store_stage, daemon=True)
+    printer = threading.Thread(target=stats.run_printer, daemon=True)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    for thread in (*embedders, writer, printer):
+        thread.start()
+
+    # --- STAGE 1: LOAD + CHUNK ---
+    # At most 2 files per worker are in flight, so parsed documents never
+    # pile up faster than the embed stage can take them.
+    paths = [
+        p for p in find_pdfs(directory)
+        if not journal.is_file_done(source_name(p, directory), p)
+        and (force or not manifest.is_file_unchanged(collection, p, source_name(p, directory)))
+    ]
+    if resume:
+        print(f"↩️  Resuming: {len(journal.completed_files)} file(s) already completed.")
+    print(f"📂 {len(paths)} PDF(s) to ingest from {os.path.abspath(directory)}")
+
+    finished = False
+    try:
+        with executor:
+            pending = []
+            for path in paths:
+                pending.append((path, executor.submit(load_and_chunk, path, chunker, chunk_size, chunk_overlap, strip_furniture)))
+                if len(pending) >= workers * 2:
+                    _hand_off(*pending.pop(0), chunked, stats)
+            for path, future in pending:
+                _hand_off(path, future, chunked, stats)
+        finished = True
+    except BaseException:
+        # Ctrl-C or a fatal error: stop embedding new batches, but still
+        # write every batch that was already paid for.
+        stop.set()
+        print("\n⚠️ Ingestion interrupted; finishing in-flight batches. Re-run with --resume to continue.")
+        raise
+    finally:
+        for _ in embedders:
+            chunked.put(_DONE)
+        for thread in embedders:
+            thread.join()
+        embedded.put(_DONE)
+        writer.join()
+        # With failures the run counts as unfinished, so --resume can
+        # retry just the files that are missing.
+        journal.close(finished=finished and not stats.counts["failed"])
+        stats.stopped.set()
+        printer.join()
+        print("\r" + stats.line())
+        if stats.counts["failed"]:
+            print(f"⚠️  {stats.counts['failed']} file(s) could not be ingested completely; "
+                  f"re-run with --resume to retry them")
+        if stats.counts["furniture_chars"]:
+            print(f"✂️  {stats.counts['furniture_chars']} characters of headers, footers and page numbers removed")
+        if stats.counts["duplicates"]:
+            print(f"♻️  {stats.counts['duplicates']} near-duplicate chunks stored as references "
+                  f"({stats.counts['duplicate_bytes'] / 1024:.1f} KB not embedded)")
+
+def _hand_off(path, future, chunked, stats):
+    """
+    Waits for one load+chunk result and queues it for embedding.
+
+    A file that failed to read, or yielded no text at all, is not synced:
+    syncing an empty or partial chunk list would delete what is stored for
+    it. It is left out of the journal too, so --resume retries it.
+    """
+    try:
+        path, page_count, chunks, report, state = future.result()
+    except Exception as e:
+        report, chunks = {"error": str(e)}, []
+    if report.get("error") or not chunks:
+        reason = report.get("error") or "no text could be extracted"
+        print(f"\n❌ Skipping {path}: {reason}")
+        stats.add(failed=1)
+        return
+    if report.get("chars_removed"):
+        print()
+        print_furniture_report(path, report)
+    stats.add(pages=page_count, chunks=len(chunks), furniture_chars=report.get("chars_removed", 0))
+    chunked.put((path, chunks, state))
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a folder of PDFs into the knowledge base.")
+    parser.add_argument("directory", help="Folder searched recursively for PDF files.")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count).")
+    parser.add_argument("--embed-workers", type=int, default=2, help="Documents embedded concurrently.")
+    parser.add_argument("--chunker", choices=["layout", "text", "tokens"], default="layout")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--force", action="store_true", help="Re-process files even if unchanged.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embed-and-write batch.")
+    parser.add_argument("--resume", action="store_true", help="Continue the last run from its journal.")
+    parser.add_argument("--keep-furniture", action="store_true",
+                        help="Keep repeated headers, footers and page numbers in the chunks.")
+    args = parser.parse_args()
+
+    from rag.vector_store import collection
+
+    run_pipeline(
+        args.directory, collection,
+        workers=args.workers, embed_workers=args.embed_workers, chunker=args.chunker,
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, force=args.force,
+        commit_batch=args.batch_size, resume=args.resume, strip_furniture=not args.keep_furniture,
+    )
+
+if __name__ == "__main__":
+    main()
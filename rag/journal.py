@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import threading
+
+from rag.extraction_cache import file_sha256
+
+# =================================================================
+# INGESTION JOURNAL (crash-safe progress log)
+# =================================================================
+# An append-only JSON-lines file with one record per completed file. Every
+# record is flushed and fsync'ed before the pipeline moves on, so after a
+# crash, a rate-limit abort or Ctrl-C the journal tells exactly which files
+# were fully written. Partly written files need no record of their own:
+# their committed rows are found by the diff against the vector store and
+# their vectors by the embedding cache.
+#
+# The journal is only started afresh once a run has finished; an
+# interrupted run's records are kept until one does, even across runs
+# started without --resume.
+
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "ingest_journal.jsonl")
+
+class IngestJournal:
+    """
+    Records the files completed by the current (possibly resumed) run.
+
+    Parameters:
+    - path (str): Journal file location.
+    - resume (bool): Skip the files completed by the interrupted run(s)
+                     recorded in the journal.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, resume=False):
+        self.path = path
+        self.completed_files = {}
+        self._lock = threading.Lock()
+
+        interrupted = os.path.exists(path) and self._replay()
+        if not resume:
+            self.completed_files = {}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a" if interrupted else "w", encoding="utf-8")
+        self._append({"event": "run_resumed" if resume else "run_started"})
+
+    def _replay(self):
+        """
+        Loads the completed files since the last finished run. Returns True
+        when the journal ends in an unfinished run.
+        """
+        interrupted = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; nothing after it counts.
+                    break
+                if record["event"] == "file_done":
+                    self.completed_files[record["source"]] = record.get("content_hash")
+                    interrupted = True
+                elif record["event"] == "run_stopped" and record.get("finished"):
+                    self.completed_files.clear()
+                    interrupted = False
+                else:
+                    interrupted = True
+        return interrupted
+
+    def _append(self, record):
+        record["time"] = time.time()
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def file_done(self, source, content_hash=None):
+        """
+        Call after every batch, update and delete of a file is written.
+        Pass the content hash the file had before it was extracted
+        (manifest.file_state), so a file edited since is not skipped on resume.
+        """
+        self._append({"event": "file_done", "source": source, "content_hash": content_hash})
+        self.completed_files[source] = content_hash
+
+    def is_file_done(self, source, path=None):
+        """
+        True when `source` was completed and, if `path` is given, the file
+        still has the content it had then.
+        """
+        if source not in self.completed_files:
+            return False
+        if path is None:
+            return True
+        # Records from older journals carry no hash and never match.
+        return self.completed_files[source] == file_sha256(path)
+
+    def close(self, finished=False):
+        """
+        Pass finished=True when the run was not interrupted; the next run
+        then starts a fresh journal.
+        """
+        self._append({"event": "run_stopped", "finished": finished})
+        self._file.close()
@@ -0,0 +1,203 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+from rag.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from rag.extraction_cache import file_sha256
+
+# =================================================================
+# INGESTION MANIFEST
+# =================================================================
+# One row per indexed source, so "is this already indexed?" is a primary-key
+# lookup in a tiny local table instead of a metadata scan of the vector store.
+#
+# Rows are keyed by the collection's id as well as the source name. Chroma
+# assigns a new id whenever a collection is created, so a wiped or
+# recreated chroma_db, or a different collection, starts with no entries
+# instead of trusting rows that describe another store. (Rows of the older
+# source-only "manifest" table are ignored for the same reason.)
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "ingest_manifest.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    collection_id   TEXT NOT NULL,
+    source          TEXT NOT NULL,
+    content_hash    TEXT,
+    mtime           REAL,
+    size            INTEGER,
+    chunks_hash     TEXT NOT NULL,
+    chunk_count     INTEGER NOT NULL,
+    embedding_model TEXT NOT NULL,
+    dimensions      INTEGER NOT NULL,
+    indexed_at      REAL NOT NULL,
+    PRIMARY KEY (collection_id, source)
+);
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    version    INTEGER NOT NULL
+);
+"""
+
+_COLUMNS = ("collection_id", "source", "content_hash", "mtime", "size", "chunks_hash",
+            "chunk_count", "embedding_model", "dimensions", "indexed_at")
+
+def _connect(check_same_thread=True):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    conn = sqlite3.connect(MANIFEST_PATH, timeout=30, check_same_thread=check_same_thread)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _collection_id(collection):
+    return str(collection.id)
+
+def get_entry(collection, source):
+    """
+    Returns the manifest row for a source in a collection as a dict, or None.
+    Rows written for another embedding model or size count as missing.
+    """
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM sources WHERE collection_id = ? AND source = ?",
+                (_collection_id(collection), source)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Ingestion manifest unavailable: {e}")
+        return None
+
+    if row is None:
+        return None
+    entry = dict(zip(_COLUMNS, row))
+    if entry["embedding_model"] != EMBEDDING_MODEL or entry["dimensions"] != EMBEDDING_DIMENSIONS:
+        return None
+    return entry
+
+def is_file_unchanged(collection, path, source):
+    """
+    True when the file at `path` was already indexed into `collection` as
+    `source` with the current embedding settings.
+
+    Same size and mtime is trusted without reading the file; otherwise the
+    SHA-256 decides (a touched but identical file still counts as unchanged).
+    """
+    entry = get_entry(collection, source)
+    if entry is None or entry["content_hash"] is None:
+        return False
+
+    stat = os.stat(path)
+    if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return True
+
+    if file_sha256(path) != entry["content_hash"]:
+        return False
+
+    # Same bytes, new timestamp: remember it so the next check is free.
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "UPDATE sources SET mtime = ?, size = ? WHERE collection_id = ? AND source = ?",
+                (stat.st_mtime, stat.st_size, entry["collection_id"], source)
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update ingestion manifest: {e}")
+    return True
+
+def file_state(path):
+    """
+    The file's content hash, mtime and size, for record().
+
+    Take it before the file is extracted: the stat comes first, so a file
+    saved while it is being ingested ends up with a stale entry and is
+    synced again next time, instead of being skipped with old chunks.
+    """
+    stat = os.stat(path)
+    return {"content_hash": file_sha256(path), "mtime": stat.st_mtime, "size": stat.st_size}
+
+def record(collection, source, chunks_hash, chunk_count, file_state=None):
+    """
+    Upserts the manifest row after a successful sync.
+
+    Parameters:
+    - collection: The ChromaDB collection the source was synced to.
+    - source (str): The 'source' name used in the vector store.
+    - chunks_hash (str): Digest of the synced chunk set (see sync_to_chroma).
+    - chunk_count (int): Number of chunks stored for the source.
+    - file_state (dict): Optional file_state() of the source file, taken
+                         before extraction; lets whole files be skipped
+                         before extraction next time.
+    """
+    state = file_state or {}
+    content_hash, mtime, size = state.get("content_hash"), state.get("mtime"), state.get("size")
+
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO sources ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                (_collection_id(collection), source, content_hash, mtime, size, chunks_hash, chunk_count,
+                 EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, time.time())
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update ingestion manifest: {e}")
+
+def forget(collection, source):
+    """
+    Drops a source's row, so its next ingestion re-processes it in full.
+    """
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM sources WHERE collection_id = ? AND source = ?",
+                (_collection_id(collection), source)
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update ingestion manifest: {e}")
+
+# =================================================================
+# COLLECTION VERSION
+# =================================================================
+# A counter bumped on every write to a collection, so query-side caches
+# in any process (the chat app, while rag.ingest runs elsewhere) can
+# tell that results they hold may be stale.
+#
+# It is read before every query, so reads share one connection that stays
+# open: a primary-key lookup instead of opening the file and running the
+# schema script each time. Outside a transaction every SELECT still sees
+# the latest committed version.
+
+_version_conn = None
+_version_lock = threading.Lock()
+
+def bump_collection_version(collection_name):
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO collection_versions VALUES (?, 1) "
+                "ON CONFLICT(collection) DO UPDATE SET version = version + 1",
+                (collection_name,)
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not update collection version: {e}")
+
+def get_collection_version(collection_name):
+    """
+    Current version of a collection (0 if it was never written).
+    """
+    global _version_conn
+    try:
+        with _version_lock:
+            if _version_conn is None:
+                _version_conn = _connect(check_same_thread=False)
+            row = _version_conn.execute(
+                "SELECT version FROM collection_versions WHERE collection = ?", (collection_name,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Ingestion manifest unavailable: {e}")
+        with _version_lock:
+            if _version_conn is not None:
+                _version_conn.close()
+            _version_conn = None
+        return None
+    return row[0] if row else 0
@@ -0,0 +1,98 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# =================================================================
+# SHARED OPENAI CLIENT
+# =================================================================
+# Every module (rag, voice, app) gets its client here, so embeddings,
+# chat, vision, transcription and speech all ride on one HTTP connection
+# pool: a turn that embeds, answers and speaks reuses warm TLS
+# connections instead of opening a new one per module.
+#
+#   from rag.openai_client import get_client
+#   client = get_client("chat")
+#
+# httpx and openai are imported on the first get_client call, not with
+# this module, so importing it costs nothing at startup.
+
+load_dotenv()
+
+# Per-call-type read/write timeouts in seconds. Connecting should always
+# be quick; how long a response may take depends on what is generated.
+CONNECT_TIMEOUT = 5.0
+TIMEOUTS = {
+    "default": 60.0,
+    "embeddings": 30.0,
+    "chat": 60.0,
+    "vision": 120.0,
+    "transcription": 60.0,
+    "speech": 30.0,
+}
+
+# Enough connections for the concurrent embedding and vision batches;
+# idle ones stay open long enough to survive the pause between turns.
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "120"))
+
+# HTTP/2 multiplexes concurrent requests over one connection. It needs the
+# optional 'h2' package (pip install "httpx[http2]").
+USE_HTTP2 = os.getenv("OPENAI_HTTP2", "0").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_http_client = None
+_clients = {}
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ OPENAI_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1.")
+        return False
+
+def get_http_client():
+    """
+    The process-wide httpx connection pool.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(TIMEOUTS["default"], connect=CONNECT_TIMEOUT),
+                http2=USE_HTTP2 and _http2_available(),
+            )
+        return _http_client
+
+def get_client(call_type="default", api_key=None):
+    """
+    Returns the shared OpenAI client for a kind of call.
+
+    Parameters:
+    - call_type (str): A key of TIMEOUTS ("embeddings", "chat", "vision",
+                       "transcription", "speech" or "default").
+    - api_key (str): Defaults to OPENAI_API_KEY. Clients for other keys
+                     still share the same connection pool.
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    key = (api_key, call_type)
+    client = _clients.get(key)
+    if client is None:
+        http_client = get_http_client()
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import httpx
+                from openai import OpenAI
+                timeout = httpx.Timeout(TIMEOUTS.get(call_type, TIMEOUTS["default"]), connect=CONNECT_TIMEOUT)
+                # with_options copies reuse the underlying http_client.
+                client = OpenAI(api_key=api_key, http_client=http_client).with_options(timeout=timeout)
+                _clients[key] = client
+    return client
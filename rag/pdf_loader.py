@@ -1,10 +1,149 @@
+import os
+import re
+from contextlib import nullcontext
 import pymupdf  # Modern way to import PyMuPDF (formerly fitz)
+from concurrent.futures import ProcessPoolExecutor
+from rag.extraction_cache import file_sha256, load_document, DocumentWriter
 
 # =================================================================
 # DOCUMENT PROCESSING: PDF TEXT EXTRACTION
 # =================================================================
 
-def extract_text_from_pdf(pdf_path):
+# Below this many pages, starting worker processes costs more than it saves.
+MIN_PAGES_FOR_POOL = 32
+
+# Part of the extraction cache key. Bump it whenever what is extracted
+# changes (page text, image references or block records), so documents
+# cached by an older version are extracted again.
+EXTRACTOR_VERSION = 3
+
+def _cache_key(pdf_path, sha256=None):
+    return f"{sha256 or file_sha256(pdf_path)}:v{EXTRACTOR_VERSION}"
+
+def _image_refs(page):
+    """
+    Lightweight references to the images on a page (no pixel data).
+    """
+    return [
+        {"xref": img[0], "width": img[2], "height": img[3], "name": img[7]}
+        for img in page.get_images(full=True)
+    ]
+
+def _extract_page(page, page_no, with_blocks):
+    """
+    One page as stored in the extraction cache.
+    """
+    return {
+        "page_no": page_no,
+        "text": page.get_text(),
+        "images": _image_refs(page),
+        "blocks": _page_blocks(page, page_no) if with_blocks else None,
+    }
+
+def _extract_page_range(pdf_path, start, stop, with_blocks=False):
+    """
+    Worker task: opens its own PyMuPDF handle (handles cannot be shared
+    across processes) and extracts pages [start, stop).
+    """
+    with pymupdf.open(pdf_path) as doc:
+        return [_extract_page(doc[i], i + 1, with_blocks) for i in range(start, stop)]
+
+def _iter_extracted_pages(pdf_path, workers, with_blocks=False):
+    """
+    Runs PyMuPDF over the document, yielding one page dict at a time
+    (see _extract_page).
+    """
+    with pymupdf.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+        # 1. SERIAL PATH
+        # Small documents (or workers=1) are read with the handle we already have.
+        if workers <= 1 or page_count < MIN_PAGES_FOR_POOL:
+            for page_no, page in enumerate(doc, start=1):
+                yield _extract_page(page, page_no, with_blocks)
+            return
+
+    # 2. PARALLEL PATH
+    # Several ranges per worker keep the pool busy when some pages
+    # (scans, dense tables) are much slower than others.
+    range_size = max(1, -(-page_count // (workers * 4)))
+    starts = list(range(0, page_count, range_size))
+    stops = [min(s + range_size, page_count) for s in starts]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # executor.map returns results in submission order, so pages
+        # come back in document order even if ranges finish out of order.
+        results = executor.map(
+            _extract_page_range, [pdf_path] * len(starts), starts, stops, [with_blocks] * len(starts)
+        )
+        for pages in results:
+            yield from pages
+
+def _iter_raw_document(pdf_path, workers, use_cache, with_blocks, report=None, sha256=None):
+    """
+    Pages exactly as PyMuPDF returns them, via the extraction cache.
+    """
+    try:
+        cache_key = _cache_key(pdf_path, sha256) if use_cache else None
+        cached = load_document(cache_key, need_blocks=with_blocks) if cache_key else None
+        if cached is not None:
+            yield from cached
+            return
+
+        # Pages go to the cache as they are yielded; only a complete pass
+        # is marked as cached, never a half-read document.
+        with DocumentWriter(cache_key) if cache_key else nullcontext() as writer:
+            for page in _iter_extracted_pages(pdf_path, workers, with_blocks):
+                if writer:
+                    writer.add(page)
+                yield page
+
+    except Exception as e:
+        # Error handling for password-protected or corrupted PDF files.
+        print(f"❌ Error reading {pdf_path}: {e}")
+        if report is not None:
+            report["error"] = str(e)
+
+def iter_pdf_pages(pdf_path, workers=1, use_cache=True, strip_furniture=False, report=None, sha256=None):
+    """
+    Streams a PDF page by page instead of building one giant string.
+
+    Unchanged files are served from rag.extraction_cache without opening
+    PyMuPDF at all; a full pass over a new file populates the cache.
+
+    Parameters:
+    - pdf_path (str): The system path to the PDF file.
+    - workers (int): Number of worker processes. With more than one, the
+                     document is split into page ranges that are extracted
+                     in parallel and yielded back in page order.
+    - use_cache (bool): Read from and write to the extraction cache.
+    - strip_furniture (bool): Remove running headers, footers and page
+                              numbers (see find_page_furniture). The
+                              document is then read twice, the second
+                              time normally from the extraction cache.
+    - report (dict): Optional; receives {"chars_removed", "chars_total"},
+                     and "error" when the file could not be read to the end.
+    - sha256 (str): The file's content hash, if the caller already has it;
+                    spares hashing the file again for the cache key.
+
+    Yields:
+    - tuple: (page_no, text) with 1-based page numbers.
+    """
+    if not strip_furniture:
+        for page in _iter_raw_document(pdf_path, workers, use_cache, False, report, sha256):
+            yield page["page_no"], page["text"]
+        return
+
+    for page, drop in _iter_without_furniture(pdf_path, workers, use_cache, report, sha256):
+        text = page["text"]
+        # Cut the furniture blocks out of the page text, last one first so
+        # earlier offsets stay valid, each with the newline that ends it.
+        for block in sorted((page["blocks"][i] for i in drop), key=lambda b: -b["char_start"]):
+            end = block["char_end"] + (text[block["char_end"]:block["char_end"] + 1] == "\n")
+            text = text[:block["char_start"]] + text[end:]
+        yield page["page_no"], text
+
+def extract_text_from_pdf(pdf_path, workers=1, use_cache=True, strip_furniture=False):
     """
     Opens a PDF file and extracts all readable text content.
     
@@ -13,28 +152,208 @@ def extract_text_from_pdf(pdf_path):
     
     Parameters:
     - pdf_path (str): The system path to the PDF file.
+    - workers (int): Worker processes for page-parallel extraction (see iter_pdf_pages).
+    - use_cache (bool): Serve unchanged files from the extraction cache.
+    - strip_furniture (bool): Drop repeated headers, footers and page numbers.
     
     Returns:
     - str: A single string containing the combined text of all pages.
     """
-    text = ""
+    report = {}
+    # We add a newline ("\n") to ensure words at the end of a page don't
+    # merge with the first word of the next page. A single join keeps
+    # this linear, unlike growing the string page by page.
+    text = "".join(
+        page + "\n" for _, page in iter_pdf_pages(pdf_path, workers, use_cache, strip_furniture, report)
+    )
+    print_furniture_report(pdf_path, report)
+    return text
+
+# =================================================================
+# PAGE FURNITURE: RUNNING HEADERS, FOOTERS & PAGE NUMBERS
+# =================================================================
+# Decided on layout blocks, by position and frequency: a block lying
+# entirely in the top or bottom margin of the page is furniture when the
+# same text sits in that margin on enough of the document's pages. Text
+# must repeat verbatim, except lines that are nothing but a page number
+# ("7", "- 7 -", "Page 7 of 20", "7 / 20"), which all count as the same.
+
+# Share of the page height at the top and bottom treated as margin.
+FURNITURE_MARGIN = 0.1
+# Share of the pages a margin block must repeat on to be removed...
+FURNITURE_MIN_SHARE = 0.5
+# ...with a minimum, since two pages are not a pattern.
+FURNITURE_MIN_PAGES = 3
+
+_PAGE_NUMBER = re.compile(r"(page\s*)?[-–—(\[]?\s*\d+\s*[-–—)\]]?(\s*(of|/)\s*\d+)?")
+
+def _furniture_key(text):
+    lines = (" ".join(line.lower().split()) for line in text.split("\n"))
+    return tuple("<page number>" if _PAGE_NUMBER.fullmatch(line) else line for line in lines if line)
+
+def _margin_blocks(blocks):
+    """
+    Yields (index, key) for the blocks inside the top or bottom margin,
+    keyed by edge, so a header never matches a footer.
+    """
+    for i, block in enumerate(blocks):
+        height = block["page_height"]
+        _, y0, _, y1 = block["bbox"]
+        if y1 <= FURNITURE_MARGIN * height:
+            yield i, ("top", _furniture_key(block["text"]))
+        elif y0 >= (1 - FURNITURE_MARGIN) * height:
+            yield i, ("bottom", _furniture_key(block["text"]))
+
+def find_page_furniture(pages):
+    """
+    Finds the margin blocks that repeat across a document.
+
+    Parameters:
+    - pages (iterable of list of dict): The blocks of each page, as built
+                                        by iter_pdf_blocks.
+
+    Returns:
+    - set: (edge, normalized text) keys to remove.
+    """
+    counts = {}
+    page_count = 0
+    for blocks in pages:
+        page_count += 1
+        for key in {key for _, key in _margin_blocks(blocks)}:
+            counts[key] = counts.get(key, 0) + 1
+    if page_count < FURNITURE_MIN_PAGES:
+        return set()
+    needed = max(FURNITURE_MIN_PAGES, FURNITURE_MIN_SHARE * page_count)
+    return {key for key, count in counts.items() if count >= needed}
+
+def _iter_without_furniture(pdf_path, workers, use_cache, report, sha256=None):
+    """
+    Yields (page dict, indexes of its furniture blocks).
+
+    Two passes instead of holding the document: the first only counts
+    margin blocks (and fills the extraction cache), the second yields.
+    """
+    first_pass = {}
     try:
-        # 1. OPEN THE DOCUMENT
-        # The 'with' statement ensures the file is closed automatically,
-        # preventing memory leaks or file-lock errors.
-        with pymupdf.open(pdf_path) as doc:
-            
-            # 2. PAGE ITERATION
-            # PyMuPDF allows us to loop through the document page by page.
-            for page in doc:
-                # 3. TEXT EXTRACTION
-                # page.get_text() extracts text in 'natural' reading order.
-                # We add a newline ("\n") to ensure words at the end of 
-                # a page don't merge with the first word of the next page.
-                text += page.get_text() + "\n"
-                
-    except Exception as e:
-        # Error handling for password-protected or corrupted PDF files.
-        print(f"❌ Error reading {pdf_path}: {e}")
-        
-    return text
\ No newline at end of file
+        # Hashed once for both passes.
+        sha256 = sha256 or (file_sha256(pdf_path) if use_cache else None)
+    except OSError as e:
+        first_pass["error"] = str(e)
+    else:
+        furniture = find_page_furniture(
+            page["blocks"] for page in _iter_raw_document(pdf_path, workers, use_cache, True, first_pass, sha256)
+        )
+    if "error" in first_pass:
+        if report is not None:
+            report["error"] = first_pass["error"]
+        return
+
+    removed = total = 0
+    for page in _iter_raw_document(pdf_path, workers, use_cache, True, report, sha256):
+        drop = {i for i, key in _margin_blocks(page["blocks"]) if key in furniture}
+        total += sum(len(block["text"]) for block in page["blocks"])
+        removed += sum(len(page["blocks"][i]["text"]) for i in drop)
+        yield page, drop
+    if report is not None:
+        report.update(chars_removed=removed, chars_total=total)
+
+def print_furniture_report(pdf_path, report):
+    if report.get("chars_removed"):
+        share = report["chars_removed"] / max(report["chars_total"], 1)
+        print(f"✂️  {os.path.basename(pdf_path)}: removed {report['chars_removed']} characters "
+              f"of headers, footers and page numbers ({share:.1%})")
+
+# =================================================================
+# LAYOUT EXTRACTION: BLOCKS WITH PAGE/OFFSET METADATA
+# =================================================================
+
+# A block counts as a heading when its font is this much larger than the
+# page's body text, or when it is short and entirely bold.
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+_BOLD_FLAG = 16
+
+def _body_font_size(blocks):
+    """
+    Returns the font size that covers the most characters on a page.
+    """
+    sizes = {}
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                size = round(span["size"], 1)
+                sizes[size] = sizes.get(size, 0) + len(span["text"])
+    return max(sizes, key=sizes.get) if sizes else 0
+
+def _page_blocks(page, page_no):
+    """
+    Turns one page's 'dict' output into block records.
+    """
+    # Type 0 blocks are text; images (type 1) are handled elsewhere.
+    blocks = [b for b in page.get_text("dict")["blocks"] if b["type"] == 0]
+    body_size = _body_font_size(blocks)
+    offset = 0
+    records = []
+
+    for block in blocks:
+        lines = ["".join(s["text"] for s in line["spans"]) for line in block["lines"]]
+        spans = [s for line in block["lines"] for s in line["spans"] if s["text"].strip()]
+        text = "\n".join(lines)
+        start = offset
+        # page.get_text() ends every line with a newline.
+        offset += sum(len(line) + 1 for line in lines)
+
+        if not spans or not text.strip():
+            continue
+
+        largest = max(s["size"] for s in spans)
+        all_bold = all(s["flags"] & _BOLD_FLAG for s in spans)
+        is_heading = len(text) <= HEADING_MAX_CHARS and (
+            largest >= body_size * HEADING_SIZE_RATIO or all_bold
+        )
+
+        records.append({
+            "page": page_no,
+            "text": text,
+            "is_heading": is_heading,
+            "char_start": start,
+            "char_end": start + len(text),
+            "bbox": [round(v, 1) for v in block["bbox"]],
+            "page_height": round(page.rect.height, 1),
+        })
+    return records
+
+def iter_pdf_blocks(pdf_path, use_cache=True, strip_furniture=False, report=None, workers=1, sha256=None):
+    """
+    Yields the text blocks (paragraphs, headings, table cells) of a PDF,
+    using PyMuPDF's 'dict' output instead of one flattened string.
+
+    Parameters:
+    - pdf_path (str): The system path to the PDF file.
+    - use_cache (bool): Serve unchanged files from the extraction cache.
+    - strip_furniture (bool): Skip blocks that repeat in the top or bottom
+                              margin of the pages (running headers,
+                              footers, page numbers). The document is then
+                              read twice, the second time normally from
+                              the extraction cache.
+    - report (dict): Optional; receives {"chars_removed", "chars_total"},
+                     and "error" when the file could not be read to the end.
+    - workers (int): Worker processes for page-parallel extraction.
+    - sha256 (str): The file's content hash, if already known (see iter_pdf_pages).
+
+    Yields:
+    - dict: {"page", "text", "is_heading", "char_start", "char_end",
+      "bbox", "page_height"}. page is 1-based; char_start/char_end index
+      into that page's page.get_text() string, so a block can be cited or
+      re-read without extracting the PDF again. bbox is (x0, y0, x1, y1)
+      in points from the top-left corner.
+    """
+    if not strip_furniture:
+        for page in _iter_raw_document(pdf_path, workers, use_cache, True, report, sha256):
+            yield from page["blocks"]
+        return
+
+    for page, drop in _iter_without_furniture(pdf_path, workers, use_cache, report, sha256):
+        for i, block in enumerate(page["blocks"]):
+            if i not in drop:
+                yield block
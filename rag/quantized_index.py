@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# =================================================================
+# QUANTIZED VECTOR INDEX (int8 / binary + float32 rescoring)
+# =================================================================
+# An optional, compact search tier next to the Chroma store. Only the
+# quantized codes live in RAM:
+#   - int8:   1 byte per dimension  (4x smaller than float32)
+#   - binary: 1 bit per dimension   (32x smaller than float32)
+# The float32 originals stay on disk (np.memmap) and are read back only
+# for the few candidates that get rescored.
+#
+#   python -m rag.quantized_index --mode binary --out data/binary_index
+
+# Rows scored per step, so temporaries stay small on million-row indexes.
+_BLOCK_ROWS = 65536
+
+# Bits set in every possible byte, for vectorized Hamming distances.
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+# How many candidates per requested result get a float32 rescore.
+DEFAULT_RESCORE_FACTOR = {"int8": 4, "binary": 10}
+
+class QuantizedIndex:
+    """
+    Exhaustive search over quantized codes followed by float32 rescoring.
+
+    Parameters:
+    - mode (str): "int8" (scalar quantization) or "binary" (sign bits).
+    """
+
+    def __init__(self, mode="int8"):
+        if mode not in DEFAULT_RESCORE_FACTOR:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.ids = []
+        self.codes = None
+        self.scale = None
+        self.vectors = None
+
+    # --- BUILD ---
+
+    def build(self, ids, vectors, vectors_path=None):
+        """
+        Quantizes vectors and keeps float32 originals for rescoring.
+
+        Parameters:
+        - ids (list of str): One id per row.
+        - vectors (np.ndarray): (n, d) float vectors.
+        - vectors_path (str): If given, originals are written to this .npy
+                              file and memory-mapped instead of kept in RAM.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.ids = list(ids)
+
+        if self.mode == "int8":
+            # Symmetric per-dimension scale: the largest magnitude maps to 127.
+            self.scale = np.abs(vectors).max(axis=0) / 127.0
+            self.scale[self.scale == 0] = 1.0
+            self.codes = np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        else:
+            self.codes = np.packbits(vectors > 0, axis=1)
+
+        if vectors_path:
+            np.save(vectors_path, vectors)
+            self.vectors = np.load(vectors_path, mmap_mode="r")
+        else:
+            self.vectors = vectors
+        return self
+
+    # --- SEARCH ---
+
+    def _approximate_scores(self, query):
+        """
+        Higher is better for both modes (binary returns negative Hamming distance).
+        """
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        if self.mode == "int8":
+            # Folding the scale into the query keeps the dot product on raw codes.
+            scaled_query = (query * self.scale).astype(np.float32)
+            for start in range(0, len(self.codes), _BLOCK_ROWS):
+                block = self.codes[start:start + _BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ scaled_query
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(self.codes), _BLOCK_ROWS):
+                block = self.codes[start:start + _BLOCK_ROWS]
+                scores[start:start + len(block)] = -_POPCOUNT[block ^ query_bits].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def search(self, query, k=5, rescore_factor=None):
+        """
+        Returns the k nearest rows as a list of (id, cosine score).
+
+        Parameters:
+        - query (np.ndarray): (d,) query vector from the same model/dimensions.
+        - k (int): Number of results.
+        - rescore_factor (int): Candidates per result rescored with float32.
+        """
+        return [(self.ids[row], score) for row, score in self.search_rows(query, k, rescore_factor)]
+
+    def search_rows(self, query, k=5, rescore_factor=None):
+        """
+        Same as search, but returns (row number, cosine score) pairs.
+        """
+        if self.codes is None or len(self.codes) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        factor = rescore_factor or DEFAULT_RESCORE_FACTOR[self.mode]
+
+        # 1. COARSE PASS over the compact codes
+        scores = self._approximate_scores(query)
+        n_candidates = min(len(scores), k * factor)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+        # 2. RESCORE the shortlist with the exact float32 vectors
+        candidates.sort()  # sequential reads from the memory-mapped file
+        exact = np.asarray(self.vectors[candidates]) @ query
+        order = np.argsort(-exact)[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    @property
+    def nbytes(self):
+        """
+        Resident size of the searchable part (codes + scale).
+        """
+        scale_bytes = self.scale.nbytes if self.scale is not None else 0
+        return (self.codes.nbytes if self.codes is not None else 0) + scale_bytes
+
+    # --- PERSISTENCE ---
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "codes.npy"), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(directory, "scale.npy"), self.scale)
+        # build() may already have written the originals to this very file
+        # and memory-mapped it; anything else (a rebuilt index, another
+        # directory) is written out, via a temporary file so readers that
+        # still map the old one are not cut short.
+        vectors_path = os.path.join(directory, "vectors.npy")
+        mapped = getattr(self.vectors, "filename", None)
+        if not (mapped and os.path.exists(vectors_path) and os.path.samefile(mapped, vectors_path)):
+            with open(vectors_path + ".tmp", "wb") as f:
+                np.save(f, np.asarray(self.vectors))
+            os.replace(vectors_path + ".tmp", vectors_path)
+        with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "ids": self.ids}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["mode"])
+        index.ids = meta["ids"]
+        index.codes = np.load(os.path.join(directory, "codes.npy"))
+        scale_path = os.path.join(directory, "scale.npy")
+        index.scale = np.load(scale_path) if os.path.exists(scale_path) else None
+        index.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        if len(index.vectors) != len(index.ids) or len(index.codes) != len(index.ids):
+            raise ValueError(f"Index in {directory} is inconsistent: {len(index.ids)} ids, "
+                             f"{len(index.codes)} codes, {len(index.vectors)} vectors")
+        return index
+
+# =================================================================
+# BUILDING FROM CHROMA & MEASURING RECALL
+# =================================================================
+
+def load_collection_vectors(collection, page_size=5000):
+    """
+    Reads every id and embedding from a Chroma collection, page by page.
+    """
+    ids, pages = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    vectors = np.concatenate(pages) if pages else np.empty((0, 0), dtype=np.float32)
+    return ids, vectors
+
+def measure_recall(index, vectors, n_queries=200, k=5, seed=0):
+    """
+    Compares index.search with exact float32 search, using stored vectors
+    as queries (each query's own row is excluded).
+
+    Returns:
+    - dict: {"recall", "mean_ms", "exact_ms"} averaged over the queries.
+    """
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    hits, approx_time, exact_time = 0, 0.0, 0.0
+
+    for row in query_rows:
+        query = vectors[row]
+
+        t0 = time.perf_counter()
+        exact = vectors @ query
+        exact[row] = -np.inf
+        truth = set(np.argpartition(-exact, k)[:k].tolist())
+        exact_time += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        found = [i for i, _ in index.search_rows(query, k + 1) if i != row][:k]
+        approx_time += time.perf_counter() - t0
+
+        hits += len(truth & set(found))
+
+    n = len(query_rows)
+    return {"recall": hits / (n * k), "mean_ms": approx_time / n * 1000, "exact_ms": exact_time / n * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a quantized index from the Chroma store and report recall.")
+    parser.add_argument("--mode", choices=sorted(DEFAULT_RESCORE_FACTOR), default="int8")
+    parser.add_argument("--out", help="Directory to save the index to.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    from rag.vector_store import collection
+
+    ids, vectors = load_collection_vectors(collection)
+    if len(ids) <= args.k:
+        print(f"❌ Need more than {args.k} vectors, found {len(ids)}.")
+        return
+
+    # With --out, the float32 originals go straight to disk and are memory-mapped.
+    vectors_path = None
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        vectors_path = os.path.join(args.out, "vectors.npy")
+    index = QuantizedIndex(args.mode).build(ids, vectors, vectors_path)
+    stats = measure_recall(index, vectors, args.queries, args.k)
+
+    print(f"📊 {len(ids)} vectors, mode={args.mode}")
+    print(f"   RAM: {index.nbytes / 1e6:.2f} MB quantized vs {vectors.nbytes / 1e6:.2f} MB float32")
+    print(f"   recall@{args.k}: {stats['recall']:.3f}  "
+          f"latency: {stats['mean_ms']:.2f} ms (exact float32: {stats['exact_ms']:.2f} ms)")
+
+    if args.out:
+        index.save(args.out)
+        print(f"✅ Index saved to {os.path.abspath(args.out)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# =================================================================
+# QUERY RESULT CACHE (exact match, in-process)
+# =================================================================
+# query_db answers repeated questions from memory: no embedding lookup,
+# no HNSW search. Entries expire after a TTL, the least recently used go
+# first when the cache is full, and everything is dropped as soon as the
+# collection's version (rag.manifest, bumped on every write) changes.
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "900"))
+
+# Stripped from the ends of words only: "C++", "node.js" and "e-mail"
+# keep the punctuation that is part of them.
+_EDGE_PUNCTUATION = "?!.,;:\"'()[]{}«»“”‘’"
+
+def normalize_query(text):
+    """
+    Case, spacing and sentence punctuation do not change what is retrieved.
+    """
+    words = (word.strip(_EDGE_PUNCTUATION) for word in text.lower().split())
+    return " ".join(word for word in words if word)
+
+class QueryCache:
+    """
+    LRU + TTL cache of query results for one collection version.
+
+    Parameters:
+    - max_entries (int): Capacity; 0 disables the cache.
+    - ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _sync_version(self, version):
+        # Called with the lock held.
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """
+        Returns the cached result, or None on a miss.
+        """
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry["cost"]
+            return entry["value"]
+
+    def put(self, key, version, value, cost):
+        """
+        Stores a result; `cost` is the seconds it took, credited on each hit.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._sync_version(version)
+            self._entries[key] = {"value": value, "cost": cost, "stored_at": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"hits", "misses", "hit_ratio", "saved_ms", "entries"}.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "saved_ms": self.saved_seconds * 1000,
+                "entries": len(self._entries),
+            }
+
+# =================================================================
+# SEMANTIC CACHE (query-embedding similarity)
+# =================================================================
+# Paraphrases ("what do you offer" / "which services do you provide")
+# miss the exact cache but embed to nearly the same vector. Recent query
+# embeddings live in one preallocated matrix; a lookup is a single
+# matmul against it, and a close enough match returns that query's chunks
+# without an HNSW search. NumPy is imported on the first put, not at startup.
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+class SemanticCache:
+    """
+    Bounded cache of retrieval results keyed on query embeddings.
+
+    Parameters:
+    - capacity (int): Maximum number of cached queries; 0 disables it.
+    - threshold (float): Minimum cosine similarity for a hit.
+    """
+
+    def __init__(self, capacity=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.capacity = capacity
+        self.threshold = threshold
+        # (capacity, d) float32 matrix of unit rows and per-row arrays,
+        # allocated on the first put once d is known.
+        self._matrix = None
+        self._n_results = None
+        self._last_used = None
+        self._costs = None
+        self._values = [None] * capacity
+        self._count = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _sync_version(self, version):
+        # Called with the lock held.
+        if version != self._version:
+            self._count = 0
+            self._values = [None] * self.capacity
+            self._version = version
+
+    @staticmethod
+    def _unit(vector):
+        import numpy as np
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector, n_results, version):
+        """
+        Returns the first n_results chunks of the most similar cached
+        query, or None when none reaches the threshold.
+        """
+        with self._lock:
+            self._sync_version(version)
+            if self._count == 0 or self._matrix is None or len(vector) != self._matrix.shape[1]:
+                self.misses += 1
+                return None
+
+            import numpy as np
+            scores = self._matrix[:self._count] @ self._unit(vector)
+            # Entries that retrieved fewer chunks than requested cannot answer.
+            scores[self._n_results[:self._count] < n_results] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = time.monotonic()
+            self.hits += 1
+            self.saved_seconds += float(self._costs[best])
+            return self._values[best][:n_results]
+
+    def put(self, vector, n_results, version, value, cost):
+        """
+        Stores a query's results, evicting the least recently used entry
+        when full. `cost` is the search time, credited on each hit.
+        """
+        if self.capacity <= 0:
+            return
+        import numpy as np
+        vector = self._unit(vector)
+        with self._lock:
+            self._sync_version(version)
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                self._matrix = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+                self._n_results = np.zeros(self.capacity, dtype=np.int32)
+                self._last_used = np.zeros(self.capacity, dtype=np.float64)
+                self._costs = np.zeros(self.capacity, dtype=np.float64)
+                self._count = 0
+
+            if self._count < self.capacity:
+                row = self._count
+                self._count += 1
+            else:
+                row = int(np.argmin(self._last_used))
+
+            self._matrix[row] = vector
+            self._n_results[row] = n_results
+            self._last_used[row] = time.monotonic()
+            self._values[row] = value
+            self._costs[row] = cost
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"hits", "misses", "hit_ratio", "saved_ms", "entries"}.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "saved_ms": self.saved_seconds * 1000,
+                "entries": self._count,
+            }
@@ -1,15 +1,38 @@
 import numpy as np
+from rag.config import EMBEDDING_DIMENSIONS
+
+def build_index(vectors, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Creates an exact inner-product FAISS index sized for the configured
+    embedding dimension (OpenAI vectors are unit length, so inner product
+    equals cosine similarity).
+    """
+    # FAISS is only needed by this in-memory path, not by the Chroma store.
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    if vectors.ndim != 2 or vectors.shape[1] != dimensions:
+        raise ValueError(f"Expected vectors of shape (n, {dimensions}), got {vectors.shape}.")
+
+    index = faiss.IndexFlatIP(dimensions)
+    index.add(vectors)
+    return index
 
 def retrieve_chunks(query, all_content, index, embed_func, k=5):
     # Ensure embed_func is actually callable
     if embed_func is None or not callable(embed_func):
         raise ValueError("The embedding function provided to retrieve_chunks is not valid.")
-        
+
     # Generate the vector for the search query
     query_vector = embed_func([query])[0].astype('float32')
-    
+
+    # A query embedded at a different size than the index would be
+    # silently meaningless, so fail loudly instead.
+    if query_vector.shape[0] != index.d:
+        raise ValueError(f"Query has {query_vector.shape[0]} dimensions but the index expects {index.d}.")
+
     # Search FAISS
     distances, indices = index.search(query_vector.reshape(1, -1), k)
-    
+
     # Return the corresponding text chunks
     return [all_content[i] for i in indices[0] if i < len(all_content)]
\ No newline at end of file
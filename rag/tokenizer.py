@@ -0,0 +1,78 @@
+import functools
+import tiktoken
+from rag.config import EMBEDDING_MODEL
+
+# =================================================================
+# TOKEN COUNTING: LOCAL BPE (OpenAI-compatible)
+# =================================================================
+
+# The embedding model decides which BPE vocabulary is used
+# (cl100k_base for text-embedding-3-small).
+_encoding = None
+_encoding_failed = False
+
+# tiktoken downloads the vocabulary on first use, from a host other than
+# api.openai.com. Where that host is unreachable, counts are estimated
+# instead, so batching and chunking keep working. OpenAI's BPE averages
+# about 4 bytes per token on English text, so 3 errs on the high side.
+ESTIMATED_BYTES_PER_TOKEN = 3
+
+def get_encoding():
+    """
+    Returns the tiktoken encoding for EMBEDDING_MODEL, loading it once,
+    or None when it cannot be loaded (it is then not retried).
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        except Exception as e:
+            _encoding_failed = True
+            print(f"⚠️ Tokenizer unavailable ({type(e).__name__}); estimating token counts.")
+    return _encoding
+
+def estimate_tokens(text):
+    """
+    Rough, generous token count from the UTF-8 length.
+    """
+    return -(-len(text.encode("utf-8")) // ESTIMATED_BYTES_PER_TOKEN)
+
+@functools.lru_cache(maxsize=65536)
+def count_tokens(text):
+    """
+    Counts model tokens in a short span of text (a word plus its leading
+    whitespace, a heading, a prompt fragment...).
+
+    Results are memoized, so repeated spans (common words, boilerplate)
+    are only ever encoded once per process.
+
+    Parameters:
+    - text (str): The span to measure.
+
+    Returns:
+    - int: Number of BPE tokens, as billed by the OpenAI API (an
+      estimate when the encoding is unavailable).
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode_ordinary(text))
+
+def count_tokens_batch(texts):
+    """
+    Counts tokens for many whole texts (chunks) in one call.
+
+    Unlike count_tokens this is not memoized, since chunks are long and
+    rarely repeat; tiktoken encodes the batch across threads instead.
+
+    Parameters:
+    - texts (list of str): The texts to measure.
+
+    Returns:
+    - list of int: Token count per text, in input order (estimates when
+      the encoding is unavailable).
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return [estimate_tokens(text) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
@@ -1,7 +1,10 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import time
+import threading
 from dotenv import load_dotenv
+from rag.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, COLLECTION_NAME
+from rag.manifest import get_collection_version
+from rag.query_cache import QueryCache, SemanticCache, normalize_query
 
 # Load variables from .env to ensure the key is available
 load_dotenv()
@@ -15,31 +18,107 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     print("❌ ERROR: OPENAI_API_KEY not found in environment variables.")
 
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=api_key,
-    model_name="text-embedding-3-small"
-)
+# =================================================================
+# LAZY INITIALIZATION
+# =================================================================
+# Opening the persistent client (and importing chromadb at all) takes
+# longer than the rest of startup together, so nothing is created until
+# the first query or write. `from rag.vector_store import collection`
+# still works and triggers the initialization.
 
-# Initialize the Chroma client
-client = chromadb.PersistentClient(path=DB_PATH)
+_lock = threading.RLock()
+_client = None
+_collection = None
 
-# Get or create the collection with the explicitly defined embedding function
-collection = client.get_or_create_collection(
-    name="betopia_knowledge", 
-    embedding_function=openai_ef
-)
+def get_chroma_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import chromadb
+            _client = chromadb.PersistentClient(path=DB_PATH)
+        return _client
+
+def get_collection():
+    """
+    The knowledge-base collection, opened on first use.
+    """
+    global _collection
+    with _lock:
+        if _collection is None:
+            from chromadb.utils import embedding_functions
+            from rag.openai_client import get_client
+
+            openai_ef = embedding_functions.OpenAIEmbeddingFunction(
+                api_key=api_key,
+                model_name=EMBEDDING_MODEL,
+                dimensions=EMBEDDING_DIMENSIONS
+            )
+            # Route its requests through the shared connection pool.
+            openai_ef.client = get_client("embeddings", api_key)
+
+            # Get or create the collection with the explicitly defined embedding function
+            _collection = get_chroma_client().get_or_create_collection(
+                name=COLLECTION_NAME,
+                embedding_function=openai_ef
+            )
+        return _collection
+
+def __getattr__(name):
+    if name == "collection":
+        return get_collection()
+    if name == "client":
+        return get_chroma_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Result caches in front of query_db (see rag/query_cache.py): exact
+# match on the question text, then similarity of the question embedding.
+query_cache = QueryCache()
+semantic_cache = SemanticCache()
 
 def query_db(query_text, n_results=5):
     """
     Queries the vector database for relevant context chunks.
+    The question is embedded through rag.embeddings, so repeated questions
+    are answered from the persistent embedding cache instead of the API.
+
+    Results are also kept in an in-process LRU+TTL cache keyed on the
+    normalized question and n_results; it is emptied whenever the
+    collection version changes (every sync bumps it). On a miss, a
+    question whose embedding is close enough to a recent one (a
+    paraphrase) reuses that question's chunks without an HNSW search.
     """
     try:
-        results = collection.query(
-            query_texts=[query_text], 
+        key = (normalize_query(query_text), n_results)
+        version = get_collection_version(COLLECTION_NAME)
+        cached = query_cache.get(key, version)
+        if cached is not None:
+            return list(cached)
+
+        t0 = time.perf_counter()
+        # Imported here: rag.embeddings refuses to load without an API key,
+        # and that should surface as a query error, not an import crash.
+        from rag.embeddings import embed_texts
+
+        query_vectors = embed_texts([query_text])
+        if len(query_vectors) == 0:
+            return []
+
+        similar = semantic_cache.get(query_vectors[0], n_results, version)
+        if similar is not None:
+            query_cache.put(key, version, similar, time.perf_counter() - t0)
+            return list(similar)
+
+        t_search = time.perf_counter()
+        results = get_collection().query(
+            query_embeddings=query_vectors, 
             n_results=n_results
         )
         # Returns the text documents found
-        return results['documents'][0] if results['documents'] else []
+        documents = results['documents'][0] if results['documents'] else []
+        semantic_cache.put(query_vectors[0], n_results, version, tuple(documents),
+                           time.perf_counter() - t_search)
+        query_cache.put(key, version, tuple(documents), time.perf_counter() - t0)
+        return documents
     except Exception as e:
         print(f"❌ Database Query Error: {e}")
-        return []
\ No newline at end of file
+        return []
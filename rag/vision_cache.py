@@ -0,0 +1,69 @@
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+# =================================================================
+# PERSISTENT IMAGE DESCRIPTION CACHE
+# =================================================================
+# Vision descriptions keyed by the SHA-256 of the image bytes, so a logo,
+# chart or diagram that reappears in another document (or in a re-ingested
+# one) is never sent to the vision model twice.
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "vision_cache.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    model       TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    image_hash  TEXT NOT NULL,
+    text        TEXT NOT NULL,
+    last_used   REAL NOT NULL,
+    PRIMARY KEY (model, prompt_hash, image_hash)
+);
+"""
+
+def _connect():
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def get_cached_descriptions(image_hashes, model, prompt_hash):
+    """
+    Returns {image_hash: description} for every cached image.
+    """
+    image_hashes = list(set(image_hashes))
+    found = {}
+    try:
+        with closing(_connect()) as conn, conn:
+            for i in range(0, len(image_hashes), 500):
+                part = image_hashes[i:i + 500]
+                found.update(conn.execute(
+                    f"SELECT image_hash, text FROM descriptions WHERE model = ? AND prompt_hash = ? "
+                    f"AND image_hash IN ({','.join('?' * len(part))})",
+                    [model, prompt_hash, *part]
+                ))
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE descriptions SET last_used = ? WHERE model = ? AND prompt_hash = ? AND image_hash = ?",
+                    [(now, model, prompt_hash, h) for h in found]
+                )
+    except sqlite3.Error as e:
+        print(f"⚠️ Vision cache unavailable: {e}")
+    return found
+
+def store_descriptions(descriptions, model, prompt_hash):
+    """
+    Saves {image_hash: description}; empty descriptions are not cached.
+    """
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO descriptions VALUES (?, ?, ?, ?, ?)",
+                [(model, prompt_hash, h, text, now) for h, text in descriptions.items() if text]
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not write vision cache: {e}")
@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+
+# =================================================================
+# STARTUP WARM-UP
+# =================================================================
+# Startup is lazy (see rag.vector_store and rag.openai_client), which
+# moves the cost of the first question onto the first question: importing
+# chromadb, reading the HNSW segment files, loading the index and the
+# first TLS handshake. The warm-up pays those costs on a background thread
+# while the user reads the banner and types.
+#
+# Opt in with `python -m app.main --warmup` or CHATOPIA_WARMUP=1.
+
+_READ_BLOCK = 1 << 20
+
+# The first query waits at most this long for the warm-up (seconds); past
+# that, e.g. offline, it runs cold rather than keep the user waiting.
+JOIN_TIMEOUT = 10.0
+
+def page_in_files(directory):
+    """
+    Reads every file under `directory` once, so the OS page cache holds
+    them when Chroma opens them. Returns the number of bytes read.
+    """
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                with open(os.path.join(root, name), "rb", buffering=0) as f:
+                    while chunk := f.read(_READ_BLOCK):
+                        total += len(chunk)
+            except OSError:
+                continue
+    return total
+
+def page_in_segments(db_path):
+    """
+    Pages in the HNSW segment directories of a Chroma store (one per
+    vector index), but not chroma.sqlite3: that file grows with every
+    document and embedding queue, and SQLite reads the few pages a query
+    needs on its own. Returns the number of bytes read.
+    """
+    return sum(page_in_files(entry.path) for entry in os.scandir(db_path) if entry.is_dir())
+
+def warm_up(timings):
+    """
+    Runs each warm-up step and records its duration (or error) in
+    `timings`. A failed step never stops the others.
+    """
+    from rag.config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+    from rag.vector_store import DB_PATH, get_collection
+    from rag.openai_client import get_client
+    from rag.tokenizer import get_encoding
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+            timings[name] = time.perf_counter() - t0
+        except Exception as e:
+            timings[name] = e
+
+    # 1. HNSW segment files into the page cache.
+    step("page_in", lambda: page_in_segments(DB_PATH))
+    # 2. chromadb import, persistent client, embedding function.
+    step("collection", get_collection)
+    # 3. The BPE vocabulary used to size embedding batches.
+    step("encoding", get_encoding)
+    # 4. One free request opens a TLS connection in the shared pool,
+    #    which the embedding and chat calls of the first turn reuse. No
+    #    retries and a short timeout: offline, the first query must not
+    #    wait long for a warm-up that cannot succeed.
+    step("connections", lambda: get_client("embeddings").with_options(max_retries=0, timeout=5.0)
+         .models.retrieve(EMBEDDING_MODEL))
+    # 5. A query with a dummy vector loads the HNSW index into memory and
+    #    imports the embedding path, without spending on an embedding.
+    def dummy_query():
+        import numpy as np
+        import rag.embeddings  # noqa: F401
+        collection = get_collection()
+        if collection.count():
+            query = np.zeros((1, EMBEDDING_DIMENSIONS), dtype=np.float32)
+            query[0, 0] = 1.0
+            collection.query(query_embeddings=query, n_results=1, include=[])
+    step("dummy_query", dummy_query)
+
+def start_warmup():
+    """
+    Starts the warm-up on a daemon thread and returns it. Join it (with
+    JOIN_TIMEOUT) before the first query so that query runs with everything
+    already loaded; `thread.timings` maps each step to seconds taken or the
+    error raised.
+    """
+    timings = {}
+    thread = threading.Thread(target=warm_up, args=(timings,), name="warmup", daemon=True)
+    thread.timings = timings
+    thread.start()
+    return thread
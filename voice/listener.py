@@ -1,12 +1,10 @@
 import sounddevice as sd
 import numpy as np
 from scipy.io.wavfile import write
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
+from rag.openai_client import get_client
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_client("transcription")
 
 def record_and_transcribe(fs=16000):
     print("\n🔴 [SYSTEM LISTENING] (Press ENTER to finish)")
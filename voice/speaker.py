@@ -1,13 +1,10 @@
-import os
 import threading
 import io
-from openai import OpenAI
-from dotenv import load_dotenv
 from pydub import AudioSegment
 from pydub.playback import play
+from rag.openai_client import get_client
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_client("speech")
 
 _is_playing_flag = False
 